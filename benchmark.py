@@ -0,0 +1,430 @@
+"""
+Time and memory-profile the hot paths of the preprocessing and of the pages
+on a synthetic rankedData.db (see generate_ranked_data.py).
+
+The database and the files written along are kept in data/benchmark/<scale>/,
+the results are saved as JSON so a later run can be compared to them:
+
+    python benchmark.py --scale 10M --compare data/benchmark/10M_<date>.json
+
+Memory is the peak of the Python allocations (numpy and pandas included) traced
+during a second run of each function, SQLite's own memory is not counted.
+"""
+
+import argparse
+import datetime
+import gc
+import importlib.util
+import json
+import os
+import platform
+import time
+import tracemalloc
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import utils
+import instrumentation
+import snapshots
+import preprocess_data
+import generate_ranked_data
+
+START_DATE = generate_ranked_data.START_DATE
+NB_DISPLAY_PLAYERS = 30
+NB_DISPLAY_SONGS = 20
+
+USER_PAGE_PATH = next(
+    (Path(__file__).parent / "pages").glob("3_Ranked_*_Specific_User_Stats.py")
+)
+
+
+class Benchmark:
+
+    """
+    Run functions, keeping their wall time, peak traced memory and number of rows
+    """
+
+    def __init__(self, memory=True):
+
+        self.memory = memory
+        self.results = []
+
+    def run(self, name, function, *args, reset=None, **kwargs):
+
+        """
+        Run function(*args, **kwargs) and return its result,
+        reset being called before each run so both runs do the same work
+        """
+
+        if reset:
+            reset()
+        gc.collect()
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        seconds = time.perf_counter() - start
+
+        peak = None
+        if self.memory:
+            del result
+            if reset:
+                reset()
+            gc.collect()
+            tracemalloc.start()
+            result = function(*args, **kwargs)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        entry = {
+            "name": name,
+            "seconds": round(seconds, 4),
+            "peakMB": None if peak is None else round(peak / 1024**2, 2),
+            "rows": instrumentation.count_rows(result),
+        }
+        self.results.append(entry)
+        print(
+            f"  {name:<40}{seconds:9.3f}s"
+            + ("" if peak is None else f"{entry['peakMB']:10.1f} MB")
+            + ("" if entry["rows"] is None else f"{entry['rows']:>12} rows")
+        )
+
+        return result
+
+
+def load_user_page():
+
+    """
+    The specific user page as a module, to run its data path without the UI
+    """
+
+    spec = importlib.util.spec_from_file_location("user_page", USER_PAGE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def benchmark_fuse_tables(bench, materialize):
+
+    sqliteConnection, cursor = utils.connect_to_database(utils.DATABASE_PATH)
+
+    def reset():
+        preprocess_data.drop_relation(cursor, "players_answers")
+
+    bench.run(
+        "fuse_tables",
+        preprocess_data.fuse_tables,
+        cursor,
+        materialize=materialize,
+        reset=reset if materialize else None,
+    )
+    sqliteConnection.close()
+
+
+def benchmark_extract(bench, username):
+
+    reference_cache = utils.get_reference_cache()
+
+    answers = bench.run("extract_new_answers", utils.extract_new_answers, 0)
+    bench.run("extract_top_user_data", utils.extract_top_user_data)
+    bench.run("extract_top_songs_data", utils.extract_top_songs_data)
+    anime_songs = bench.run(
+        "extract_anime_songs", utils.extract_anime_songs, reset=reference_cache.clear
+    )
+    bench.run("get_song_index", utils.get_song_index, reset=reference_cache.clear)
+    bench.run(
+        "extract_answers_username", utils.extract_answers_username, username, START_DATE
+    )
+
+    return answers, anime_songs
+
+
+def benchmark_process(bench, answers, anime_songs, end_date):
+
+    """
+    Every process_* function of the preprocessing, along with the aggregates they use
+    """
+
+    s, e = START_DATE, end_date
+
+    bench.run(
+        "process_top_player_df",
+        preprocess_data.process_top_player_df,
+        answers,
+        s,
+        e,
+        NB_DISPLAY_PLAYERS,
+    )
+    bench.run("process_top_regions", preprocess_data.process_top_regions, answers, s, e)
+    top_songs = bench.run(
+        "process_top_anime_songs",
+        preprocess_data.process_top_anime_songs,
+        answers,
+        anime_songs,
+        s,
+        e,
+        NB_DISPLAY_SONGS,
+    )
+
+    player_games = bench.run(
+        "aggregate_player_games", preprocess_data.aggregate_player_games, answers
+    )
+    song_games = bench.run(
+        "aggregate_song_games", preprocess_data.aggregate_song_games, answers
+    )
+    bench.run(
+        "process_top_player_games",
+        preprocess_data.process_top_player_games,
+        player_games,
+        s,
+        e,
+        NB_DISPLAY_PLAYERS,
+    )
+    top_regions = bench.run(
+        "process_top_regions_games",
+        preprocess_data.process_top_regions_games,
+        player_games,
+        s,
+        e,
+    )
+    bench.run(
+        "process_top_song_games",
+        preprocess_data.process_top_song_games,
+        song_games,
+        anime_songs,
+        s,
+        e,
+        NB_DISPLAY_SONGS,
+    )
+
+    stats = bench.run(
+        "aggregate_player_stats", preprocess_data.aggregate_player_stats, player_games
+    )
+    all_top = bench.run(
+        "process_players_top", preprocess_data.process_players_top, stats
+    )
+    bench.run("process_player_ranks", preprocess_data.process_player_ranks, all_top)
+
+    windows = preprocess_data.get_rank_windows(s, e, player_games.date.max())
+    windows_stats = [stats] + [
+        preprocess_data.aggregate_player_stats(
+            preprocess_data.filter_dates(player_games, *window)
+        )
+        for window in windows[1:]
+    ]
+    bench.run(
+        "process_rank_index",
+        preprocess_data.process_rank_index,
+        windows,
+        windows_stats,
+    )
+    player_outputs = bench.run(
+        "process_player_outputs",
+        preprocess_data.process_player_outputs,
+        stats,
+        preprocess_data.best_player_games(player_games),
+        top_regions,
+        windows,
+        windows_stats,
+        s,
+        NB_DISPLAY_PLAYERS,
+    )
+    bench.run(
+        "process_day_cube",
+        preprocess_data.process_day_cube,
+        player_games,
+        "playerDays",
+        s,
+    )
+    bench.run(
+        "process_stats_over_time",
+        preprocess_data.process_stats_over_time,
+        player_games,
+    )
+    bench.run(
+        "process_player_days_outputs",
+        preprocess_data.process_player_days_outputs,
+        player_games,
+        s,
+    )
+    song_outputs = bench.run(
+        "process_song_outputs",
+        preprocess_data.process_song_outputs,
+        top_songs,
+        s,
+        NB_DISPLAY_SONGS,
+    )
+
+    # The figures are built from the snapshots as the pages read them
+    outputs = {}
+    for snapshot in player_outputs + song_outputs:
+        snapshots.write_snapshot(**snapshot)
+        outputs[snapshot["name"]] = snapshot
+    bench.run("process_figures", preprocess_data.process_figures, outputs)
+
+
+def benchmark_user_page(bench, answers, username, end_date):
+
+    """
+    Data path of the specific user page, from the history written by the preprocessing
+    """
+
+    history = answers[utils.HISTORY_COLUMNS]
+    bench.run(
+        "write_history",
+        snapshots.write_history,
+        history,
+        answers.rankedId.max(),
+    )
+    player_answers = bench.run(
+        "load_history",
+        snapshots.load_history,
+        username,
+        START_DATE,
+        end_date,
+    )
+
+    page = load_user_page()
+    for name, process in page.USER_RESULTS.items():
+        bench.run(f"user_page.process_{name}", process, player_answers)
+
+    result_cache = utils.get_result_cache()
+    bench.run(
+        "user_page.get_user_results",
+        page.get_user_results,
+        username,
+        START_DATE,
+        end_date,
+        reset=result_cache.clear,
+    )
+
+
+def run_benchmarks(memory=True, materialize=False):
+
+    bench = Benchmark(memory)
+
+    benchmark_fuse_tables(bench, materialize)
+
+    # The player with the most answers, the slowest for the user page
+    with utils.database_cursor() as cursor:
+        username = utils.run_sql_command(
+            cursor,
+            "SELECT playerName FROM players_answers GROUP BY playerName ORDER BY COUNT(*) DESC, playerName LIMIT 1",
+        )[0][0]
+    end_date = datetime.date.today()
+
+    answers, anime_songs = benchmark_extract(bench, username)
+    benchmark_process(bench, answers, anime_songs, end_date)
+    benchmark_user_page(bench, answers, username, end_date)
+
+    # process_* functions added later show up here until they get a benchmark
+    covered = {entry["name"] for entry in bench.results}
+    missing = [
+        name
+        for name in dir(preprocess_data)
+        if name.startswith("process_") and name not in covered
+    ]
+
+    return bench.results, missing
+
+
+def compare(results, previous):
+
+    """
+    Print the ratio of each timing and peak memory to the previous results
+    """
+
+    previous = {entry["name"]: entry for entry in previous["results"]}
+
+    print(f"\n  {'':<40}{'time':>10}{'memory':>10}")
+    for entry in results:
+        before = previous.get(entry["name"])
+        if before is None:
+            continue
+        ratios = [
+            f"{entry[key] / before[key]:9.2f}x"
+            if entry[key] and before[key]
+            else " " * 10
+            for key in ["seconds", "peakMB"]
+        ]
+        print(f"  {entry['name']:<40}{''.join(ratios)}")
+
+
+def main(scale, output=None, previous=None, memory=True, materialize=False):
+
+    path = (generate_ranked_data.BENCHMARK_PATH / scale).resolve()
+    output = Path(output).resolve() if output else None
+    previous = Path(previous).resolve() if previous else None
+
+    database_path = path / utils.DATABASE_PATH
+    if not database_path.exists():
+        print(f"Generating {scale} answers in {database_path}")
+        generate_ranked_data.generate(
+            database_path, generate_ranked_data.parse_scale(scale)
+        )
+
+    # Every module reads and writes its data relative to the working directory
+    os.chdir(path)
+
+    print(f"Benchmark on {database_path}")
+    results, missing = run_benchmarks(memory, materialize)
+
+    report = {
+        "scale": scale,
+        "createdAt": datetime.datetime.now().isoformat(timespec="seconds"),
+        "materialize": materialize,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "results": results,
+        "notBenchmarked": missing,
+    }
+
+    if output is None:
+        output = (
+            path.parent
+            / f"{scale}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+        )
+    with open(output, "w", encoding="utf-8") as output_file:
+        json.dump(report, output_file, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if missing:
+        print(f"Not benchmarked: {', '.join(missing)}")
+
+    if previous:
+        with open(previous, encoding="utf-8") as previous_file:
+            compare(results, json.load(previous_file))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Benchmark the preprocessing and the pages on a synthetic database"
+    )
+    parser.add_argument(
+        "--scale",
+        default="1M",
+        help=f"number of answers, one of {', '.join(generate_ranked_data.SCALES)} or a plain number",
+    )
+    parser.add_argument("--output", help="path of the JSON results")
+    parser.add_argument(
+        "--compare", help="JSON results of a previous run to compare this one to"
+    )
+    parser.add_argument(
+        "--no-memory",
+        action="store_true",
+        help="only time the functions, without the second traced run",
+    )
+    parser.add_argument(
+        "--materialize",
+        action="store_true",
+        help="benchmark with players_answers materialized as a table",
+    )
+    args = parser.parse_args()
+
+    main(
+        args.scale,
+        output=args.output,
+        previous=args.compare,
+        memory=not args.no_memory,
+        materialize=args.materialize,
+    )
@@ -0,0 +1,33 @@
+"""
+Preprocessed snapshots shared by the sessions of the pages.
+
+A snapshot is cached along with the version of its manifest entry, so once a new
+preprocessing publishes another version the next rerun loads it instead.
+"""
+
+import streamlit as st
+import snapshots
+
+
+def load_versioned_snapshot(name, start_date, index=None):
+
+    """
+    Current version of the snapshot with its manifest entry,
+    indexed and sorted by the index columns if given
+    """
+
+    entry = snapshots.get_snapshot_entry(name, start_date)
+    return load_snapshot_version(name, start_date, entry["version"], index), entry
+
+
+@st.cache_resource(show_spinner=False)
+def load_snapshot_version(name, start_date, version, index=None):
+
+    entry = snapshots.get_snapshot_entry(name, start_date)
+    if entry["file"].endswith(".json"):
+        return snapshots.load_json_snapshot(name, start_date)
+
+    snapshot = snapshots.load_snapshot(name, start_date)
+    if index is not None:
+        snapshot = snapshot.set_index(list(index)).sort_index()
+    return snapshot
@@ -0,0 +1,322 @@
+"""
+Plotly figures of the General Stats page, built from the preprocessed tables.
+
+They are returned as plain dicts: the preprocessing stores them as JSON for the
+preprocessed date range, and the page renders them as they are.
+"""
+
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+import plotly.io.json as plotly_json
+import plotly.subplots as subplots
+
+color_map = {
+    "Asia": "rgb(255, 171, 171)",
+    "Europe": "rgb(131, 201, 255)",
+    "America": "rgb(0, 104, 201)",
+}
+
+# Tables of the Top Anime / Songs section, in the order of top_anime_songs_figures
+SONG_TABLES = ["topSpamAnime", "topSpamSongs", "topEasySongs", "topHardSongs"]
+
+
+def lollipop_lines(values, positions, color="crimson", width=3):
+
+    """
+    Lines of a lollipop chart, from 0 to each value, as a single trace
+    instead of one shape per line
+    """
+
+    x, y = [], []
+    for value, position in zip(values, positions):
+        x += [0, value, None]
+        y += [position, position, None]
+
+    return go.Scatter(
+        x=x,
+        y=y,
+        mode="lines",
+        line=dict(color=color, width=width),
+        hoverinfo="skip",
+        showlegend=False,
+    )
+
+
+def top_players_figures(topScore, topTime, topSolo):
+
+    """
+    Podium and figures of the Top Players section
+    """
+
+    topScore = topScore.assign(
+        date=pd.to_datetime(topScore.date).dt.strftime("%Y-%m-%d")
+    ).sort_values(by=["score"])
+
+    podium = [
+        f"👑 {topScore.iloc[-1].playerName}: {topScore.iloc[-1].score} points | {topScore.iloc[-1].date}",
+        f"⚔️ {topScore.iloc[-2].playerName}: {topScore.iloc[-2].score} points | {topScore.iloc[-2].date}",
+        f"🗡️ {topScore.iloc[-3].playerName}: {topScore.iloc[-3].score} points | {topScore.iloc[-3].date}",
+    ]
+
+    customdata = [
+        [x, y]
+        for x, y in zip(
+            topScore.date,
+            topScore.region,
+        )
+    ]
+
+    # Create the stacked bar chart
+    fig = px.bar(
+        topScore,
+        x="score",
+        y="playerName",
+        height=550,
+        width=730,
+    )
+    fig.update_traces(
+        customdata=customdata,
+        hovertemplate="%{y}<br>%{x} Points<br>%{customdata[0]} %{customdata[1]}",
+        hoverlabel=dict(font=dict(color="blue")),
+    )
+    fig.update_yaxes(title="Player", dtick=1)
+    fig.update_xaxes(
+        title="Best Score", range=[min(topScore.score) - 2, max(topScore.score)]
+    )
+    fig.update_layout(hovermode="y")
+
+    # Create the stacked bar chart
+    fig2 = px.bar(
+        topTime,
+        x="nbSongs",
+        y="playerName",
+        color="region",
+        color_discrete_map=color_map,
+        category_orders={"playerName": topTime.playerName.unique()},
+        height=600,
+        width=730,
+    )
+
+    fig2.update_yaxes(title="Player", dtick=1)
+    fig2.update_xaxes(title="Number of songs played")
+    fig2.update_layout(hovermode="y unified")
+
+    # Create the stacked bar chart
+    topSolo = topSolo.sort_values(by=["nbSoloPoints"])
+    fig3 = go.Figure()
+
+    # Draw lines
+    fig3.add_trace(lollipop_lines(topSolo.nbSoloPoints, topSolo.playerName))
+    fig3.add_trace(
+        go.Scatter(
+            x=topSolo.nbSoloPoints,
+            y=topSolo.playerName,
+            mode="markers",
+            marker_color="darkred",
+            marker_size=12,
+            hovertemplate="%{y}<br>%{x} times<extra></extra>",
+            hoverlabel=dict(font=dict(color="darkred")),
+        )
+    )
+
+    fig3.update_yaxes(title="Player", dtick=1)
+    fig3.update_xaxes(title="Number of solo points")
+    fig3.update_layout(
+        hovermode="y",
+        height=600,
+        width=730,
+    )
+
+    return {
+        "podium": podium,
+        "bestScores": fig.to_dict(),
+        "mostSongs": fig2.to_dict(),
+        "soloPoints": fig3.to_dict(),
+    }
+
+
+def top_regions_figures(topRegions):
+
+    """
+    Figures of the Top Regions section
+    """
+
+    # Create a figure with two traces: one for the bars and one for the horizontal lines
+    fig = go.Figure(
+        data=[
+            # Create the bars using the go.Bar trace type
+            go.Bar(
+                name="playerCount",
+                x=topRegions["region"],
+                y=topRegions["playerCount"],
+                marker_color=[color_map[region] for region in topRegions["region"]],
+            ),
+            # Create the horizontal lines using the go.Scatter trace type
+            go.Scatter(
+                name="playerAverage",
+                x=topRegions["region"],
+                y=topRegions["playerAverage"],
+                mode="lines+markers",
+                line=dict(color="red", width=3),
+                marker=dict(size=10, color="red"),
+            ),
+        ]
+    )
+
+    # Set the title and axis labels
+    fig.update_layout(
+        xaxis_title="Region",
+        yaxis_title="Total player Count",
+        # Set the colors of the legend items
+        legend=dict(
+            title=None,
+            itemsizing="constant",
+            bordercolor="#E2E2E2",
+            borderwidth=2,
+        ),
+    )
+
+    fig2 = px.bar(
+        topRegions,
+        x="region",
+        y="averageGuessRate",
+        color="region",
+        color_discrete_map=color_map,
+    )
+    fig2.update_yaxes(
+        title="Average guess rate",
+        range=[
+            min(topRegions.averageGuessRate) - 5,
+            max(topRegions.averageGuessRate) + 5,
+        ],
+    )
+
+    return {"playerbase": fig.to_dict(), "guessRate": fig2.to_dict()}
+
+
+def top_anime_songs_figures(topSpamAnime, topSpamSongs, topEasySongs, topHardSongs):
+
+    """
+    Figures of the Top Anime / Songs section
+    """
+
+    topSpamAnime = topSpamAnime.sort_values(by=["playCount"], ascending=True)
+    topSpamAnime["label"] = topSpamAnime.animeName.apply(
+        lambda x: x[:40] + ("..." if len(x) > 40 else "")
+    )
+    fig = px.bar(topSpamAnime, x="playCount", y="label")
+    fig.update_traces(
+        hovertemplate="%{label}<br>%{x} times",
+        hoverlabel=dict(font=dict(color="blue")),
+    )
+    fig.update_yaxes(title="Anime")
+    fig.update_xaxes(title="Play count")
+    spamAnime = fig.to_dict()
+
+    topSpamSongs = topSpamSongs.sort_values(by=["playCount"], ascending=True)
+    topSpamSongs["label"] = topSpamSongs.songName.apply(
+        lambda x: x[:40] + ("..." if len(x) > 40 else "")
+    )
+    fig = px.bar(topSpamSongs, x="playCount", y="label")
+    fig.update_traces(
+        customdata=topSpamSongs.songInfo,
+        hovertemplate="%{customdata}<br>%{x} times",
+        hoverlabel=dict(font=dict(color="blue")),
+    )
+    fig.update_yaxes(title="Songs")
+    fig.update_xaxes(
+        title="Play count",
+        range=[topSpamSongs.playCount.min() - 2, topSpamSongs.playCount.min() + 2],
+    )
+    spamSongs = fig.to_dict()
+
+    topEasySongs = topEasySongs.sort_values(by=["guessRate"], ascending=True)
+
+    # Create a bar chart for the bottom 20 elements
+    fig_bottom = px.bar(
+        topHardSongs,
+        x="guessRate",
+        y="songName",
+        title="Bottom 20 Elements",
+        height=550,
+    )
+
+    customdata = [
+        [x, y, z]
+        for x, y, z in zip(
+            topHardSongs.songInfo,
+            topHardSongs.playerCount,
+            topHardSongs.animeName.str.join(", "),
+        )
+    ]
+    fig_bottom.update_traces(
+        customdata=customdata,
+        hovertemplate="%{customdata[0]}<br>%{customdata[2]}<br>Guess Rate: %{x}%<br>%{customdata[1]} guesses",
+        marker_color="rgb(255, 127, 127)",
+        hoverlabel=dict(font=dict(color="red")),
+    )
+
+    # Create a bar chart for the top 20 elements
+    fig_top = px.bar(
+        topEasySongs,
+        x="guessRate",
+        y="songName",
+        title="Top 20 Elements",
+        height=550,
+    )
+
+    customdata = [
+        [x, y, z]
+        for x, y, z in zip(
+            topEasySongs.songInfo,
+            topEasySongs.playerCount,
+            topEasySongs.animeName.str.join(", "),
+        )
+    ]
+    fig_top.update_traces(
+        customdata=customdata,
+        hovertemplate="%{customdata[0]}<br>%{customdata[2]}<br>Guess Rate: %{x}%<br>%{customdata[1]} guesses",
+        marker_color="lightgreen",
+        hoverlabel=dict(font=dict(color="green")),
+    )
+
+    # Combine the two charts into a single figure with a split x-axis
+    fig = subplots.make_subplots(
+        rows=1, cols=2, shared_yaxes=True, specs=[[{}, {"secondary_y": True}]]
+    )
+
+    # Add the bottom 20 elements to the left y-axis
+    fig.add_trace(fig_bottom["data"][0], row=1, col=1)
+
+    # Add the top 20 elements to the right y-axis
+    fig.add_trace(fig_top["data"][0], row=1, col=2, secondary_y=True)
+
+    # Set the titles and labels for the y-axes
+    fig.update_layout(
+        height=550,
+        yaxis1=dict(title="Songs", dtick=1),
+        yaxis2=dict(dtick=1),
+        xaxis1=dict(title="Hardest songs", dtick=1),
+        xaxis2=dict(
+            title="Easiest songs",
+            dtick=2,
+            range=[topEasySongs.guessRate.max() + 1, topEasySongs.guessRate.min() - 1],
+        ),
+        hovermode="y",
+    )
+
+    return {
+        "spamAnime": spamAnime,
+        "spamSongs": spamSongs,
+        "hardEasySongs": fig.to_dict(),
+    }
+
+
+def to_json(figures):
+
+    """
+    Figures as JSON, numpy arrays and dates included
+    """
+
+    return plotly_json.to_json_plotly(figures)
@@ -0,0 +1,230 @@
+"""
+Build a synthetic rankedData.db with the same tables as the real one
+(anime, songs, players, ranked_games, ranked_songs, player_answers),
+to measure the preprocessing and the pages at a given number of answers.
+
+Every day has one ranked game per region, each game playing 45 songs to
+the players of the region who showed up that day.
+"""
+
+import argparse
+import datetime
+import sqlite3
+import time
+from pathlib import Path
+import numpy as np
+
+BENCHMARK_PATH = Path("data/benchmark")
+
+# Number of answers of each named scale
+SCALES = {"1M": 1_000_000, "10M": 10_000_000, "50M": 50_000_000}
+
+START_DATE = datetime.date(2022, 10, 1)
+NB_DAYS = 90
+NB_SONGS_PER_GAME = 45
+
+# Region of the ranked_games table: 1 Asia, 2 Europe, 3 America
+REGIONS = [1, 2, 3]
+
+NB_ANIME = 5000
+NB_SONGS = 25000
+
+# Share of the players of a region playing its ranked on a given day
+ATTENDANCE = 0.6
+
+# Every 5th song of a game comes from the most popular songs
+NB_POPULAR_SONGS = 300
+
+SCHEMA = """
+CREATE TABLE anime(id INTEGER PRIMARY KEY, annid INTEGER, anime_name TEXT);
+CREATE TABLE songs(id INTEGER PRIMARY KEY, anime_id INTEGER, name TEXT, artist TEXT, type INTEGER, type_number INTEGER, difficulty REAL);
+CREATE TABLE players(id INTEGER PRIMARY KEY, name TEXT);
+CREATE TABLE ranked_games(id INTEGER PRIMARY KEY, date TEXT, region INTEGER);
+CREATE TABLE ranked_songs(id INTEGER PRIMARY KEY, ranked_game_id INTEGER, song_number INTEGER, song_id INTEGER, start_time REAL, correct_count INTEGER, active_players INTEGER);
+CREATE TABLE player_answers(id INTEGER PRIMARY KEY, player_id INTEGER, ranked_song_id INTEGER, anime_id INTEGER, guess_time REAL, if_correct INTEGER);
+"""
+
+
+def parse_scale(scale):
+
+    """
+    Number of answers of a named scale (1M, 10M, 50M) or of a plain number
+    """
+
+    return SCALES[scale] if scale in SCALES else int(scale)
+
+
+def insert_rows(cursor, table, *columns):
+
+    placeholders = ", ".join("?" * len(columns))
+    cursor.executemany(
+        f"INSERT INTO {table} VALUES ({placeholders})",
+        zip(*(column.tolist() for column in columns)),
+    )
+
+
+def generate_catalogue(cursor, rng):
+
+    """
+    Anime and songs, a few song names being shared by several songs
+    """
+
+    anime_ids = np.arange(1, NB_ANIME + 1)
+    insert_rows(
+        cursor,
+        "anime",
+        anime_ids,
+        anime_ids + 1000,
+        np.array([f"Anime {i}" for i in anime_ids], dtype=object),
+    )
+
+    song_ids = np.arange(1, NB_SONGS + 1)
+    insert_rows(
+        cursor,
+        "songs",
+        song_ids,
+        rng.integers(1, NB_ANIME + 1, NB_SONGS),
+        np.array([f"Song {i % (NB_SONGS * 9 // 10)}" for i in song_ids], dtype=object),
+        np.array([f"Artist {i % 997}" for i in song_ids], dtype=object),
+        rng.integers(1, 4, NB_SONGS),
+        rng.integers(1, 5, NB_SONGS),
+        (rng.random(NB_SONGS) * 100).round(1),
+    )
+
+
+def generate_players(cursor, nb_players):
+
+    player_ids = np.arange(1, nb_players + 1)
+    insert_rows(
+        cursor,
+        "players",
+        player_ids,
+        np.array([f"player{i}" for i in player_ids], dtype=object),
+    )
+
+
+def generate_game(cursor, rng, ids, date, region, players, skill):
+
+    """
+    One ranked game: its 45 songs and the answers of the players who showed up,
+    ids being the last id used in each table
+    """
+
+    ids["ranked_games"] += 1
+    cursor.execute(
+        "INSERT INTO ranked_games VALUES (?, ?, ?)",
+        (ids["ranked_games"], str(date), region),
+    )
+
+    present = players[rng.random(players.size) < ATTENDANCE]
+
+    song_numbers = np.arange(1, NB_SONGS_PER_GAME + 1)
+    songs = np.where(
+        song_numbers % 5 == 0,
+        rng.integers(1, NB_POPULAR_SONGS + 1, NB_SONGS_PER_GAME),
+        rng.integers(1, NB_SONGS + 1, NB_SONGS_PER_GAME),
+    )
+    ranked_song_ids = ids["ranked_songs"] + song_numbers
+    ids["ranked_songs"] += NB_SONGS_PER_GAME
+
+    # One row per song, one column per player
+    correct = rng.random((NB_SONGS_PER_GAME, present.size)) < (
+        skill[present][None, :] * rng.random(NB_SONGS_PER_GAME)[:, None]
+    )
+
+    insert_rows(
+        cursor,
+        "ranked_songs",
+        ranked_song_ids,
+        np.full(NB_SONGS_PER_GAME, ids["ranked_games"]),
+        song_numbers,
+        songs,
+        song_numbers * 20.0,
+        correct.sum(axis=1),
+        np.full(NB_SONGS_PER_GAME, present.size),
+    )
+
+    nb_answers = correct.size
+    insert_rows(
+        cursor,
+        "player_answers",
+        ids["player_answers"] + np.arange(1, nb_answers + 1),
+        np.tile(present, NB_SONGS_PER_GAME),
+        np.repeat(ranked_song_ids, present.size),
+        rng.integers(1, NB_ANIME + 1, nb_answers),
+        (rng.random(nb_answers) * 20).round(2),
+        correct.ravel().astype(np.int8),
+    )
+    ids["player_answers"] += nb_answers
+
+
+def generate(path, nb_answers, nb_days=NB_DAYS, seed=0):
+
+    """
+    Write a synthetic ranked database of about nb_answers answers at path
+    """
+
+    path = Path(path)
+    if path.exists():
+        raise FileExistsError(f"{path} already exists")
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+
+    # Enough players in each region for the games to reach nb_answers
+    nb_games = nb_days * len(REGIONS)
+    players_per_game = max(1, round(nb_answers / nb_games / NB_SONGS_PER_GAME))
+    players_per_region = max(1, round(players_per_game / ATTENDANCE))
+    nb_players = players_per_region * len(REGIONS)
+
+    sqliteConnection = sqlite3.connect(path)
+    cursor = sqliteConnection.cursor()
+    cursor.execute("PRAGMA journal_mode = OFF")
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.executescript(SCHEMA)
+
+    generate_catalogue(cursor, rng)
+    generate_players(cursor, nb_players)
+
+    skill = np.concatenate([[0], rng.beta(2, 2, nb_players)])
+    regions = rng.permutation(np.repeat(REGIONS, players_per_region))
+    region_players = {
+        region: np.flatnonzero(regions == region) + 1 for region in REGIONS
+    }
+
+    ids = {"ranked_games": 0, "ranked_songs": 0, "player_answers": 0}
+    for day in range(nb_days):
+        date = START_DATE + datetime.timedelta(days=day)
+        for region in REGIONS:
+            generate_game(cursor, rng, ids, date, region, region_players[region], skill)
+        sqliteConnection.commit()
+
+    sqliteConnection.close()
+
+    return ids["player_answers"]
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic ranked database")
+    parser.add_argument(
+        "--scale",
+        default="1M",
+        help=f"number of answers, one of {', '.join(SCALES)} or a plain number",
+    )
+    parser.add_argument("--days", type=int, default=NB_DAYS, help="number of days")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="path of the database, data/benchmark/<scale>/data/raw/rankedData.db by default",
+    )
+    args = parser.parse_args()
+
+    output = args.output or BENCHMARK_PATH / args.scale / "data/raw/rankedData.db"
+
+    start = time.perf_counter()
+    nb_answers = generate(output, parse_scale(args.scale), args.days, args.seed)
+    print(
+        f"{nb_answers} answers written to {output} in {time.perf_counter() - start:.1f}s"
+    )
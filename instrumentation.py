@@ -0,0 +1,216 @@
+"""
+Opt-in instrumentation of the extractors and of the plot functions of the pages.
+
+Set AMQ_STATS_INSTRUMENTATION=1 to record the wall time, the number of rows returned
+and the growth of the peak resident memory of every @instrumented call. The records
+of each rerun are shown in a debug panel of the sidebar, and every record is appended
+to a rotating JSONL log (data/logs/instrumentation.jsonl) for offline analysis.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import datetime
+import functools
+import threading
+import logging
+import logging.handlers
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+INSTRUMENTATION_ENV = "AMQ_STATS_INSTRUMENTATION"
+
+LOG_PATH = Path("data/logs/instrumentation.jsonl")
+LOG_MAX_BYTES = 10 * 1024**2
+LOG_BACKUP_COUNT = 5
+
+# Each session reruns its script in its own thread, so the records of a rerun are per thread
+_state = threading.local()
+_logger_lock = threading.Lock()
+
+
+def is_enabled():
+
+    return os.environ.get(INSTRUMENTATION_ENV, "") not in ("", "0")
+
+
+def count_rows(result):
+
+    """
+    Number of rows of a result, summed over the frames of a tuple, list or dict
+    """
+
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(result)
+    if isinstance(result, dict):
+        result = list(result.values())
+    if isinstance(result, (tuple, list)):
+        counts = [count_rows(value) for value in result]
+        counts = [count for count in counts if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def read_memory():
+
+    """
+    Current and peak resident memory of the process in bytes.
+    Without /proc only the peak is known, the current memory is None
+    """
+
+    try:
+        with open("/proc/self/status", encoding="ascii") as status_file:
+            memory = {
+                key: int(value.split()[0]) * 1024
+                for key, value in (line.split(":", 1) for line in status_file)
+                if key in ("VmRSS", "VmHWM")
+            }
+        return memory.get("VmRSS"), memory.get("VmHWM")
+    except (OSError, ValueError):
+        pass
+
+    if resource is None:
+        return None, None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB, except on macOS where it is in bytes
+    return None, peak if sys.platform == "darwin" else peak * 1024
+
+
+def get_logger():
+
+    """
+    Logger appending one JSON record per line to LOG_PATH, rotated at LOG_MAX_BYTES
+    """
+
+    logger = logging.getLogger("amq_stats.instrumentation")
+    with _logger_lock:
+        if not logger.handlers:
+            LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(
+                LOG_PATH,
+                maxBytes=LOG_MAX_BYTES,
+                backupCount=LOG_BACKUP_COUNT,
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+    return logger
+
+
+def record(entry):
+
+    """
+    Keep entry with the records of the current rerun and append it to the log
+    """
+
+    entry = {
+        "rerun": getattr(_state, "rerun", None),
+        "page": getattr(_state, "page", None),
+        **entry,
+    }
+    records = getattr(_state, "records", None)
+    if records is not None:
+        records.append(entry)
+    get_logger().info(json.dumps(entry))
+
+
+def instrumented(function):
+
+    """
+    Record the wall time, rows returned and peak resident memory growth of each call
+    when the instrumentation is enabled.
+
+    The peak is the high-water mark of the whole process: it only grows when the call
+    uses more memory than the process ever did, and other sessions count towards it
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+
+        if not is_enabled():
+            return function(*args, **kwargs)
+
+        started_at = datetime.datetime.now()
+        rss_before, peak_before = read_memory()
+        start = time.perf_counter()
+        result = None
+        try:
+            result = function(*args, **kwargs)
+            return result
+        finally:
+            # A failing call is recorded too, without rows
+            seconds = time.perf_counter() - start
+            rss_after, peak_after = read_memory()
+            record(
+                {
+                    "module": function.__module__,
+                    "function": function.__qualname__,
+                    "startedAt": started_at.isoformat(timespec="milliseconds"),
+                    "seconds": round(seconds, 4),
+                    "rows": count_rows(result),
+                    "peakRssDeltaMB": None
+                    if peak_before is None
+                    else round((peak_after - peak_before) / 1024**2, 2),
+                    "rssDeltaMB": None
+                    if rss_before is None
+                    else round((rss_after - rss_before) / 1024**2, 2),
+                }
+            )
+
+    return wrapper
+
+
+@contextmanager
+def instrumented_rerun(page):
+
+    """
+    Collect the records of one rerun of page and show them in the sidebar at the end
+    """
+
+    if not is_enabled():
+        yield
+        return
+
+    _state.rerun = uuid.uuid4().hex[:12]
+    _state.page = page
+    _state.records = []
+    try:
+        yield
+        records = _state.records
+    finally:
+        _state.rerun = _state.page = _state.records = None
+    show_records(records)
+
+
+def show_records(records):
+
+    """
+    Debug panel of the sidebar with the records of the rerun
+    """
+
+    # Only the pages show the records, the preprocessing does not need streamlit
+    import streamlit as st
+
+    with st.sidebar.expander("Debug - instrumentation", expanded=False):
+        if not records:
+            st.caption("No instrumented call in this rerun")
+            return
+        df = pd.DataFrame(records)[
+            ["function", "seconds", "rows", "peakRssDeltaMB", "rssDeltaMB"]
+        ].astype({"rows": "Int64"})
+        st.caption(
+            f"{len(df)} calls this rerun, nested calls are also counted in their caller"
+        )
+        st.dataframe(df, hide_index=True, use_container_width=True)
+        st.caption(f"Appended to {LOG_PATH}")
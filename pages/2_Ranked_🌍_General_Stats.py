@@ -15,23 +15,32 @@
 import streamlit as st
 import datetime
 import utils
+import snapshots
+import cached_snapshots
+import preprocess_data
+import figures
+import instrumentation
 import plotly.express as px
-import plotly.graph_objects as go
 import gc
 import pandas as pd
-from pathlib import Path
-import plotly.subplots as subplots
-
-
-PREPROCESSED_DATA_PATH = Path("data/preprocessed")
 
 # Enable garbage collection
 gc.enable()
 
-color_map = {
-    "Asia": "rgb(255, 171, 171)",
-    "Europe": "rgb(131, 201, 255)",
-    "America": "rgb(0, 104, 201)",
+color_map = figures.color_map
+
+# Start date of the leaderboards written by the preprocessing
+PREPROCESSED_START_DATE = datetime.date(2022, 10, 1)
+
+# Number of players and songs in the top tables
+NB_DISPLAY_PLAYERS = 30
+NB_DISPLAY_SONGS = 20
+
+# Label of each metric of the song explorer
+SONG_METRIC_LABELS = {
+    "Play count": "playCount",
+    "Player count": "playerCount",
+    "Guess rate": "guessRate",
 }
 
 
@@ -47,380 +56,467 @@ def get_data(start_date, end_date):
     return anime_songs, player_answers
 
 
-# @st.cache(ttl=24 * 3600, suppress_st_warning=True)
-def load_top_users_data(start_date, nbDisplay):
+def get_day_cube(name):
 
-    topScore = pd.read_csv(
-        PREPROCESSED_DATA_PATH / Path(f"topScore_{nbDisplay}_{start_date}.csv")
-    )
-    topTime = pd.read_csv(
-        PREPROCESSED_DATA_PATH / Path(f"topTime_{nbDisplay}_{start_date}.csv")
-    )
-    topSolo = pd.read_csv(
-        PREPROCESSED_DATA_PATH / Path(f"topSolo_{nbDisplay}_{start_date}.csv")
+    """
+    Per day totals written by the preprocessing, with their manifest entry
+    """
+
+    return cached_snapshots.load_versioned_snapshot(name, PREPROCESSED_START_DATE)
+
+
+def has_day_cubes():
+
+    try:
+        get_day_cube("playerDays")
+        get_day_cube("songDays")
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def is_preprocessed_range(start_date, end_date):
+
+    """
+    Whether the leaderboards written by the preprocessing cover exactly this date range
+    """
+
+    if start_date != PREPROCESSED_START_DATE:
+        return False
+    try:
+        last_date = get_day_cube("playerDays")[1]["metadata"]["lastDate"]
+    except FileNotFoundError:
+        return True
+    return str(end_date) >= last_date
+
+
+def has_range_data(start_date, end_date):
+
+    player_days = get_day_cube("playerDays")[0]
+    return not preprocess_data.filter_dates(player_days, start_date, end_date).empty
+
+
+@instrumentation.instrumented
+def get_range_results(section, start_date, end_date, nbDisplay=None):
+
+    """
+    Leaderboards of a section of the page between start_date and end_date, summed from the
+    day cubes and shared by the sessions through the result cache until the cubes change
+    """
+
+    cube_name = "songDays" if section == "songs" else "playerDays"
+    days, entry = get_day_cube(cube_name)
+
+    key = (
+        "generalStats",
+        section,
+        str(start_date),
+        str(end_date),
+        nbDisplay,
+        entry["version"],
     )
+    cache = utils.get_result_cache()
 
-    return topScore, topTime, topSolo
+    results = cache.get(key)
+    if results is None:
+        if section == "players":
+            results = preprocess_data.process_top_player_games(
+                days, start_date, end_date, nbDisplay
+            )
+        elif section == "regions":
+            results = preprocess_data.process_top_regions_games(
+                days, start_date, end_date
+            )
+        else:
+            results = preprocess_data.process_top_song_games(
+                days, utils.extract_anime_songs(), start_date, end_date, nbDisplay
+            )
+        cache.put(key, results)
+
+    return results
 
 
 # @st.cache(ttl=24 * 3600, suppress_st_warning=True)
-def load_top_regions_data(start_date):
+def load_top_users_data(start_date, end_date, nbDisplay):
 
-    topRegions = pd.read_csv(
-        PREPROCESSED_DATA_PATH / Path(f"topRegions_{start_date}.csv")
-    )
+    score_columns = ["date", "region", "playerName", "score"]
+    time_columns = ["playerName", "region", "nbSongs"]
+    solo_columns = ["playerName", "nbSoloPoints"]
 
-    return topRegions
+    if is_preprocessed_range(start_date, end_date):
+        topScore = snapshots.load_snapshot(
+            "topScore", start_date, nbDisplay, columns=score_columns
+        )
+        topTime = snapshots.load_snapshot(
+            "topTime", start_date, nbDisplay, columns=time_columns
+        )
+        topSolo = snapshots.load_snapshot(
+            "topSolo", start_date, nbDisplay, columns=solo_columns
+        )
+    else:
+        topScore, topTime, topSolo = get_range_results(
+            "players", start_date, end_date, nbDisplay
+        )
+
+    return topScore[score_columns], topTime[time_columns], topSolo[solo_columns]
 
 
 # @st.cache(ttl=24 * 3600, suppress_st_warning=True)
-def load_top_anime_songs_data(start_date, nbDisplay):
+def load_top_regions_data(start_date, end_date):
 
-    topSpamAnime = pd.read_csv(
-        PREPROCESSED_DATA_PATH / Path(f"topSpamAnime_{nbDisplay}_{start_date}.csv")
-    )
-    topSpamSongs = pd.read_csv(
-        PREPROCESSED_DATA_PATH / Path(f"topSpamSongs_{nbDisplay}_{start_date}.csv")
+    region_columns = ["region", "playerCount", "playerAverage", "averageGuessRate"]
+
+    if is_preprocessed_range(start_date, end_date):
+        topRegions = snapshots.load_snapshot(
+            "topRegions", start_date, columns=region_columns
+        )
+    else:
+        topRegions = get_range_results("regions", start_date, end_date)
+
+    return topRegions[region_columns]
+
+
+# @st.cache(ttl=24 * 3600, suppress_st_warning=True)
+def load_top_anime_songs_data(start_date, end_date, nbDisplay):
+
+    song_columns = [
+        "songInfo",
+        "songName",
+        "animeName",
+        "playCount",
+        "playerCount",
+        "guessRate",
+    ]
+
+    if is_preprocessed_range(start_date, end_date):
+        topSpamAnime = snapshots.load_snapshot(
+            "topSpamAnime", start_date, nbDisplay, columns=["animeName", "playCount"]
+        )
+        topSpamSongs = snapshots.load_snapshot(
+            "topSpamSongs", start_date, nbDisplay, columns=song_columns
+        )
+        topEasySongs = snapshots.load_snapshot(
+            "topEasySongs", start_date, nbDisplay, columns=song_columns
+        )
+        topHardSongs = snapshots.load_snapshot(
+            "topHardSongs", start_date, nbDisplay, columns=song_columns
+        )
+    else:
+        (
+            topSpamAnime,
+            topSpamSongs,
+            topEasySongs,
+            topHardSongs,
+        ) = get_range_results("songs", start_date, end_date, nbDisplay)
+
+    return (
+        topSpamAnime[["animeName", "playCount"]],
+        topSpamSongs[song_columns],
+        topEasySongs[song_columns],
+        topHardSongs[song_columns],
     )
-    topEasySongs = pd.read_csv(
-        PREPROCESSED_DATA_PATH / Path(f"topEasySongs_{nbDisplay}_{start_date}.csv")
+
+
+def build_section_figures(section, start_date, end_date):
+
+    if section == "players":
+        return figures.top_players_figures(
+            *load_top_users_data(start_date, end_date, NB_DISPLAY_PLAYERS)
+        )
+    if section == "regions":
+        return figures.top_regions_figures(load_top_regions_data(start_date, end_date))
+    return figures.top_anime_songs_figures(
+        *load_top_anime_songs_data(start_date, end_date, NB_DISPLAY_SONGS)
     )
-    topHardSongs = pd.read_csv(
-        PREPROCESSED_DATA_PATH / Path(f"topHardSongs_{nbDisplay}_{start_date}.csv")
+
+
+def get_section_figures(section, start_date, end_date):
+
+    """
+    Figures of a section of the page as plain dicts. The ones of the preprocessed range come
+    from the preprocessing, the others are built once for each date range and shared by
+    the sessions through the result cache until the preprocessing runs again
+    """
+
+    if is_preprocessed_range(start_date, end_date):
+        try:
+            preprocessed, _ = cached_snapshots.load_versioned_snapshot(
+                "figures", start_date
+            )
+            return preprocessed[section]
+        except FileNotFoundError:
+            pass
+
+    key = (
+        "generalStatsFigures",
+        section,
+        str(start_date),
+        str(end_date),
+        snapshots.manifest_version(),
     )
+    cache = utils.get_result_cache()
 
-    return topSpamAnime, topSpamSongs, topEasySongs, topHardSongs
+    section_figures = cache.get(key)
+    if section_figures is None:
+        section_figures = build_section_figures(section, start_date, end_date)
+        cache.put(key, section_figures)
 
+    return section_figures
 
-def plot_top_players(start_date):
 
-    st.markdown("# Top Players")
+@instrumentation.instrumented
+def plot_top_players(start_date, end_date):
 
-    nbDisplay = 30
+    st.markdown("# Top Players")
 
     st.markdown("### Top Players - Best Scores")
 
     st.caption("*Only keeping best score for each player")
 
-    topScore, topTime, topSolo = load_top_users_data(start_date, nbDisplay)
-
-    topScore = topScore.sort_values(by=["score"])
+    section_figures = get_section_figures("players", start_date, end_date)
 
     col1, col2, col3 = st.columns(3)
     with col2:
-        st.image(
-            "static/gold.png",
-            width=250,
-            caption=f"👑 {topScore.iloc[-1].playerName}: {topScore.iloc[-1].score} points | {topScore.iloc[-1].date}",
-        )
+        st.image("static/gold.png", width=250, caption=section_figures["podium"][0])
 
     del col1, col2, col3
 
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.image(
-            "static/silver.png",
-            width=250,
-            caption=f"⚔️ {topScore.iloc[-2].playerName}: {topScore.iloc[-2].score} points | {topScore.iloc[-2].date}",
-        )
+        st.image("static/silver.png", width=250, caption=section_figures["podium"][1])
     with col3:
-        st.image(
-            "static/bronze.png",
-            width=250,
-            caption=f"🗡️ {topScore.iloc[-3].playerName}: {topScore.iloc[-3].score} points | {topScore.iloc[-3].date}",
-        )
+        st.image("static/bronze.png", width=250, caption=section_figures["podium"][2])
 
-    customdata = [
-        [x, y]
-        for x, y in zip(
-            topScore.date,
-            topScore.region,
-        )
-    ]
-
-    # Create the stacked bar chart
-    fig = px.bar(
-        topScore,
-        x="score",
-        y="playerName",
-        height=550,
-        width=730,
-    )
-    fig.update_traces(
-        customdata=customdata,
-        hovertemplate="%{y}<br>%{x} Points<br>%{customdata[0]} %{customdata[1]}",
-        hoverlabel=dict(font=dict(color="blue")),
-    )
-    fig.update_yaxes(title="Player", dtick=1)
-    fig.update_xaxes(
-        title="Best Score", range=[min(topScore.score) - 2, max(topScore.score)]
-    )
-    fig.update_layout(hovermode="y")
-
-    st.plotly_chart(fig)
+    st.plotly_chart(section_figures["bestScores"])
 
     st.markdown("### Top Players - Most Songs Played")
 
-    # Create the stacked bar chart
-    fig2 = px.bar(
-        topTime,
-        x="nbSongs",
-        y="playerName",
-        color="region",
-        color_discrete_map=color_map,
-        category_orders={"playerName": topTime.playerName.unique()},
-        height=600,
-        width=730,
-    )
-
-    fig2.update_yaxes(title="Player", dtick=1)
-    fig2.update_xaxes(title="Number of songs played")
-    fig2.update_layout(hovermode="y unified")
-
-    st.plotly_chart(fig2)
+    st.plotly_chart(section_figures["mostSongs"])
 
     st.markdown("### Top Players - Most Solo Points")
 
-    # Create the stacked bar chart
-    topSolo = topSolo.sort_values(by=["nbSoloPoints"])
-    fig3 = go.Figure()
-
-    fig3.add_trace(
-        go.Scatter(
-            x=topSolo.nbSoloPoints,
-            y=topSolo.playerName,
-            mode="markers",
-            marker_color="darkred",
-            marker_size=12,
-        )
-    )
-    # Draw lines
-    for i, x_ in enumerate(topSolo.nbSoloPoints):
-        fig3.add_shape(
-            type="line",
-            x0=0,
-            y0=i,
-            x1=x_,
-            y1=i,
-            line=dict(color="crimson", width=3),
-        )
-
-    fig3.update_yaxes(title="Player", dtick=1)
-    fig3.update_xaxes(title="Number of solo points")
-    fig3.update_traces(
-        hovertemplate="%{y}<br>%{x} times<extra></extra>",
-        hoverlabel=dict(font=dict(color="darkred")),
-    )
-    fig3.update_layout(
-        hovermode="y",
-        height=600,
-        width=730,
-    )
-    st.plotly_chart(fig3)
-
-    del topScore, topTime, fig, fig2, fig3, col1, col2, col3
+    st.plotly_chart(section_figures["soloPoints"])
 
 
-def plot_top_region(start_date):
+@instrumentation.instrumented
+def plot_top_region(start_date, end_date):
 
     st.markdown("# Top Regions")
 
-    topRegions = load_top_regions_data(start_date)
+    section_figures = get_section_figures("regions", start_date, end_date)
 
     st.markdown("### Top Regions - Total playerbase")
 
-    # Create a figure with two traces: one for the bars and one for the horizontal lines
-    fig = go.Figure(
-        data=[
-            # Create the bars using the go.Bar trace type
-            go.Bar(
-                name="playerCount",
-                x=topRegions["region"],
-                y=topRegions["playerCount"],
-                marker_color=[color_map[region] for region in topRegions["region"]],
-            ),
-            # Create the horizontal lines using the go.Scatter trace type
-            go.Scatter(
-                name="playerAverage",
-                x=topRegions["region"],
-                y=topRegions["playerAverage"],
-                mode="lines+markers",
-                line=dict(color="red", width=3),
-                marker=dict(size=10, color="red"),
-            ),
-        ]
-    )
-
-    # Set the title and axis labels
-    fig.update_layout(
-        xaxis_title="Region",
-        yaxis_title="Total player Count",
-        # Set the colors of the legend items
-        legend=dict(
-            title=None,
-            itemsizing="constant",
-            bordercolor="#E2E2E2",
-            borderwidth=2,
-        ),
-    )
-
-    st.plotly_chart(fig)
+    st.plotly_chart(section_figures["playerbase"])
 
     st.markdown("### Top Regions - Guess Rate")
 
     st.caption("*Only counting the top 150 player for each region")
 
-    fig = px.bar(
-        topRegions,
-        x="region",
-        y="averageGuessRate",
-        color="region",
-        color_discrete_map=color_map,
-    )
-    fig.update_yaxes(
-        title="Average guess rate",
-        range=[
-            min(topRegions.averageGuessRate) - 5,
-            max(topRegions.averageGuessRate) + 5,
-        ],
-    )
-
-    st.plotly_chart(fig)
+    st.plotly_chart(section_figures["guessRate"])
 
 
-def plot_top_anime_songs(start_date):
+@instrumentation.instrumented
+def plot_top_anime_songs(start_date, end_date):
 
     st.markdown("# Top Anime / Songs")
 
-    nbDisplay = 20
-    topSpamAnime, topSpamSongs, topEasySongs, topHardSongs = load_top_anime_songs_data(
-        start_date, nbDisplay
-    )
+    section_figures = get_section_figures("songs", start_date, end_date)
 
     st.markdown("### Spamming Anime")
 
-    topSpamAnime = topSpamAnime.sort_values(by=["playCount"], ascending=True)
-    topSpamAnime["label"] = topSpamAnime.animeName.apply(
-        lambda x: x[:40] + ("..." if len(x) > 40 else "")
-    )
-    fig = px.bar(topSpamAnime, x="playCount", y="label")
-    fig.update_traces(
-        hovertemplate="%{label}<br>%{x} times",
-        hoverlabel=dict(font=dict(color="blue")),
-    )
-    fig.update_yaxes(title="Anime")
-    fig.update_xaxes(title="Play count")
-
-    st.plotly_chart(fig)
+    st.plotly_chart(section_figures["spamAnime"])
 
     st.markdown("### Spamming Songs")
 
-    topSpamSongs = topSpamSongs.sort_values(by=["playCount"], ascending=True)
-    topSpamSongs["label"] = topSpamSongs.songName.apply(
-        lambda x: x[:40] + ("..." if len(x) > 40 else "")
-    )
-    fig = px.bar(topSpamSongs, x="playCount", y="label")
-    fig.update_traces(
-        customdata=topSpamSongs.songInfo,
-        hovertemplate="%{customdata}<br>%{x} times",
-        hoverlabel=dict(font=dict(color="blue")),
-    )
-    fig.update_yaxes(title="Songs")
-    fig.update_xaxes(
-        title="Play count",
-        range=[topSpamSongs.playCount.min() - 2, topSpamSongs.playCount.min() + 2],
-    )
-
-    st.plotly_chart(fig)
+    st.plotly_chart(section_figures["spamSongs"])
 
     st.markdown("### Hardest / Easiest Songs")
 
-    topEasySongs = topEasySongs.sort_values(by=["guessRate"], ascending=True)
-
     st.caption(
         "*Played at least 3 times in ranked for hardest songs, and at least twice for easiest songs"
     )
 
-    # Create a bar chart for the bottom 20 elements
-    fig_bottom = px.bar(
-        topHardSongs,
-        x="guessRate",
-        y="songName",
-        title="Bottom 20 Elements",
-        height=550,
+    st.plotly_chart(section_figures["hardEasySongs"])
+
+    # Other songs and anime rankings are queried from the song cube
+    if has_day_cubes():
+        plot_song_explorer(start_date, end_date)
+
+
+def load_stats_over_time_data(start_date, end_date, period):
+
+    """
+    Daily, weekly and monthly stats of each region rolled up by the preprocessing
+    """
+
+    stats, _ = cached_snapshots.load_versioned_snapshot(
+        "statsOverTime", PREPROCESSED_START_DATE
     )
 
-    customdata = [
-        [x, y, z]
-        for x, y, z in zip(
-            topHardSongs.songInfo, topHardSongs.playerCount, topHardSongs.animeName
-        )
+    # Keep the bin the start date falls in
+    freq = preprocess_data.OVER_TIME_PERIODS[period]
+    first_bin = pd.Timestamp(start_date).to_period(freq).start_time
+
+    return stats[
+        (stats.period == period)
+        & (stats.date >= first_bin)
+        & (stats.date <= str(end_date))
     ]
-    fig_bottom.update_traces(
-        customdata=customdata,
-        hovertemplate="%{customdata[0]}<br>%{customdata[2]}<br>Guess Rate: %{x}%<br>%{customdata[1]} guesses",
-        marker_color="rgb(255, 127, 127)",
-        hoverlabel=dict(font=dict(color="red")),
-    )
 
-    # Create a bar chart for the top 20 elements
-    fig_top = px.bar(
-        topEasySongs,
-        x="guessRate",
-        y="songName",
-        title="Top 20 Elements",
-        height=550,
+
+def load_song_query(start_date, end_date, **query):
+
+    """
+    Top songs or anime of the song explorer, shared by the sessions
+    through the result cache until the song cube changes
+    """
+
+    days, entry = get_day_cube("songDays")
+
+    key = (
+        "songQuery",
+        str(start_date),
+        str(end_date),
+        tuple(sorted(query.items())),
+        entry["version"],
     )
+    cache = utils.get_result_cache()
 
-    customdata = [
-        [x, y, z]
-        for x, y, z in zip(
-            topEasySongs.songInfo, topEasySongs.playerCount, topEasySongs.animeName
+    top = cache.get(key)
+    if top is None:
+        top = preprocess_data.query_top_songs(
+            days,
+            utils.extract_anime_songs(),
+            start_date=start_date,
+            end_date=end_date,
+            **query,
         )
-    ]
-    fig_top.update_traces(
-        customdata=customdata,
-        hovertemplate="%{customdata[0]}<br>%{customdata[2]}<br>Guess Rate: %{x}%<br>%{customdata[1]} guesses",
-        marker_color="lightgreen",
-        hoverlabel=dict(font=dict(color="green")),
-    )
+        cache.put(key, top)
+
+    return top
+
+
+@instrumentation.instrumented
+def plot_song_explorer(start_date, end_date):
+
+    st.markdown("### Song Explorer")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        by = st.radio(":blue[Rank:]", ["Songs", "Anime"], horizontal=True)
+        metric_label = st.selectbox(":blue[By:]", list(SONG_METRIC_LABELS))
+    with col2:
+        order = st.radio(":blue[Order:]", ["Highest", "Lowest"], horizontal=True)
+        regions = st.multiselect(":blue[Regions:]", sorted(color_map))
+    with col3:
+        min_player_count = st.number_input(
+            ":blue[Minimum guesses:]", min_value=0, value=100, step=50
+        )
+        min_play_count = st.number_input(":blue[Minimum plays:]", min_value=0, value=1)
 
-    # Combine the two charts into a single figure with a split x-axis
-    fig = subplots.make_subplots(
-        rows=1, cols=2, shared_yaxes=True, specs=[[{}, {"secondary_y": True}]]
+    nbDisplay = st.slider(":blue[Number to display:]", 5, 50, value=20)
+
+    metric = SONG_METRIC_LABELS[metric_label]
+    top = load_song_query(
+        start_date,
+        end_date,
+        metric=metric,
+        nbDisplay=nbDisplay,
+        ascending=order == "Lowest",
+        regions=tuple(regions),
+        min_player_count=int(min_player_count),
+        min_play_count=int(min_play_count),
+        by=by.lower().rstrip("s"),
     )
 
-    # Add the bottom 20 elements to the left y-axis
-    fig.add_trace(fig_bottom["data"][0], row=1, col=1)
-
-    # Add the top 20 elements to the right y-axis
-    fig.add_trace(fig_top["data"][0], row=1, col=2, secondary_y=True)
-
-    # Set the titles and labels for the y-axes
-    fig.update_layout(
-        height=550,
-        yaxis1=dict(title="Songs", dtick=1),
-        yaxis2=dict(dtick=1),
-        xaxis1=dict(title="Hardest songs", dtick=1),
-        xaxis2=dict(
-            title="Easiest songs",
-            dtick=2,
-            range=[topEasySongs.guessRate.max() + 1, topEasySongs.guessRate.min() - 1],
+    if top.empty:
+        st.info("No song matches these filters")
+        return
+
+    name = "animeName" if by == "Anime" else "songName"
+    info = "animeName" if by == "Anime" else "songInfo"
+
+    top = top.iloc[::-1]
+    fig = px.bar(
+        top.assign(
+            label=top[name].apply(lambda x: x[:40] + ("..." if len(x) > 40 else ""))
         ),
-        hovermode="y",
+        x=metric,
+        y="label",
+        height=max(400, 22 * len(top)),
+    )
+    fig.update_traces(
+        customdata=top[[info, "playCount", "playerCount", "guessRate"]],
+        hovertemplate="%{customdata[0]}<br>%{customdata[1]} plays, %{customdata[2]} guesses<br>Guess Rate: %{customdata[3]}%<extra></extra>",
+        hoverlabel=dict(font=dict(color="blue")),
     )
+    fig.update_yaxes(title=by, dtick=1)
+    fig.update_xaxes(title=metric_label)
 
     st.plotly_chart(fig)
 
 
-def plot_over_time(start_date):
+@instrumentation.instrumented
+def plot_over_time(start_date, end_date):
 
     st.markdown("# Stats Over Time")
 
+    period = st.radio(
+        ":blue[Period:]",
+        [period.capitalize() for period in preprocess_data.OVER_TIME_PERIODS],
+        index=0,
+        horizontal=True,
+    ).lower()
+
+    try:
+        stats = load_stats_over_time_data(start_date, end_date, period)
+    except FileNotFoundError:
+        st.write("In development...")
+        return
+
     st.markdown("### Playerbase over time")
-    st.write("In development...")
+
+    st.caption(f"*Number of different players in each {period}")
+
+    fig = px.line(
+        stats,
+        x="date",
+        y="playerCount",
+        color="region",
+        color_discrete_map=color_map,
+        markers=True,
+    )
+    fig.update_yaxes(title="Player count")
+    fig.update_xaxes(title="Date")
+    fig.update_layout(hovermode="x unified")
+
+    st.plotly_chart(fig)
+
     st.markdown("### Average Guess Rate over time")
-    st.write("In development...")
+
+    fig = px.line(
+        stats,
+        x="date",
+        y="guessRate",
+        color="region",
+        color_discrete_map=color_map,
+        markers=True,
+    )
+    fig.update_yaxes(title="Average guess rate")
+    fig.update_xaxes(title="Date")
+    fig.update_layout(hovermode="x unified")
+
+    st.plotly_chart(fig)
+
+
+# Sections of the page, only the selected one is loaded and rendered
+SECTIONS = {
+    "Top Players": plot_top_players,
+    "Top Regions": plot_top_region,
+    "Top Anime / Songs": plot_top_anime_songs,
+    "Stats Over Time": plot_over_time,
+}
 
 
 def initialize():
@@ -438,20 +534,43 @@ def initialize():
     )
     st.caption("*Data was not being collected from November 23rd to December 3rd")
 
-    start_date = datetime.date(2022, 10, 1)
+    start_date = PREPROCESSED_START_DATE
 
     end_date = datetime.date.today()
 
+    # Other date ranges are summed from the day cubes, when the preprocessing wrote them
+    if has_day_cubes():
+        col1, col2 = st.columns(2)
+        with col1:
+            start_date = st.date_input(
+                "Start date",
+                start_date,
+                min_value=PREPROCESSED_START_DATE,
+                max_value=end_date,
+            )
+        with col2:
+            end_date = st.date_input(
+                "End date",
+                end_date,
+                min_value=PREPROCESSED_START_DATE,
+                max_value=end_date,
+            )
+
     if start_date > end_date:
         st.error("Error: End date must fall after start date.")
         return False, False, False
 
+    if has_day_cubes() and not has_range_data(start_date, end_date):
+        st.error(f"No ranked data between {start_date} and {end_date}.")
+        return False, False, False
+
     # anime_songs, players_answers = get_data(start_date, end_date)
 
-    plot_top_players(start_date)
-    plot_top_region(start_date)
-    plot_top_anime_songs(start_date)
-    # plot_over_time(start_date)
+    section = st.radio(
+        "Section", list(SECTIONS), horizontal=True, label_visibility="collapsed"
+    )
+    SECTIONS[section](start_date, end_date)
 
 
-initialize()
+with instrumentation.instrumented_rerun("Ranked - General"):
+    initialize()
@@ -14,12 +14,16 @@
 
 import streamlit as st
 import numpy as np, pandas as pd
-from pathlib import Path
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 import datetime, re
 import utils
+import snapshots
+import cached_snapshots
+import preprocess_data
+import figures
+import instrumentation
 
 
 color_map = {
@@ -28,42 +32,182 @@ color_map = {
     "America": "rgb(0, 104, 201)",
 }
 
-PREPROCESSED_DATA_PATH = Path("data/preprocessed")
+# Only the columns the plots below actually use
+USER_ANSWERS_COLUMNS = (
+    "rankedId",
+    "date",
+    "region",
+    "rankedSongId",
+    "songId",
+    "correctCount",
+    "isCorrect",
+)
 
+# Start date of the preprocessed data, and the allTop metric behind each ranking
+PREPROCESSED_START_DATE = datetime.date(2022, 10, 1)
+RANKING_METRICS = {"score": "score", "time": "nbSongs", "solo": "nbSoloPoints"}
 
-def get_username_data(username, start_date, end_date):
+# Maximum of the low pointer slider
+MAX_LOW_POINTER = 10
+
+
+# Columns the rank index is looked up by
+RANK_INDEX_COLUMNS = ("windowStart", "windowEnd", "playerName")
+
+
+def get_rank_window(windows, start_date, end_date, last_date):
+
+    """
+    Precomputed window holding the same days as start_date to end_date, None if there is none.
+    Without last_date, the data is taken to stop at the end of each window
+    """
 
-    anime_songs = utils.extract_anime_songs()
-    player_answers = utils.extract_answers_username(username)
+    for start, window_end in windows:
+        last = window_end if last_date is None else last_date
+        if start == str(start_date) and min(window_end, last) == min(
+            str(end_date), last
+        ):
+            return (start, window_end)
+    return None
 
-    player_answers = player_answers[player_answers.date >= str(start_date)]
-    player_answers = player_answers[player_answers.date <= str(end_date)]
 
-    rankings = pd.read_csv(PREPROCESSED_DATA_PATH / Path(f"allTop_{start_date}.csv"))
-    rankings = rankings[["playerName", "nbSongs", "score", "nbSoloPoints"]]
+def get_covering_window(windows, start_date, end_date):
 
-    userRankings = rankings[rankings.playerName == username]
+    """
+    Shortest precomputed window starting on start_date and covering end_date,
+    the whole period if there is none
+    """
 
-    if userRankings.empty:
-        return anime_songs, pd.DataFrame(), {}
+    candidates = [
+        (start, end)
+        for start, end in windows
+        if start == str(start_date) and end >= str(end_date)
+    ]
+    if not candidates:
+        return tuple(windows[0])
+    return min(candidates, key=lambda window: window[1])
 
-    rankings_output = {}
-    tmp = rankings.sort_values(by=["score"], ascending=False).reset_index(drop=True)
-    tmp = tmp[tmp.score == userRankings.score.values[0]].index.values
-    rankings_output["score"] = [min(tmp) + 1, max(tmp) + 1]
 
-    tmp = rankings.sort_values(by=["nbSongs"], ascending=False).reset_index(drop=True)
-    tmp = tmp[tmp.nbSongs == userRankings.nbSongs.values[0]].index.values
-    rankings_output["time"] = [min(tmp) + 1, max(tmp) + 1]
+def get_range_ranks(start_date, end_date):
 
-    tmp = rankings.sort_values(by=["nbSoloPoints"], ascending=False).reset_index(
-        drop=True
+    """
+    Ranks of every player between start_date and end_date rolled up from the player day cube,
+    shared by the sessions through the result cache until the cube changes
+    """
+
+    player_days, entry = cached_snapshots.load_versioned_snapshot(
+        "playerDays", PREPROCESSED_START_DATE
     )
+    key = ("userRanks", str(start_date), str(end_date), entry["version"])
+    cache = utils.get_result_cache()
+
+    ranks = cache.get(key)
+    if ranks is None:
+        player_days = preprocess_data.filter_dates(player_days, start_date, end_date)
+        ranks = preprocess_data.process_player_ranks(
+            preprocess_data.process_players_top(
+                preprocess_data.aggregate_player_stats(player_days)
+            )
+        ).set_index("playerName")
+        cache.put(key, ranks)
 
-    tmp = tmp[tmp.nbSoloPoints == userRankings.nbSoloPoints.values[0]].index.values
-    rankings_output["solo"] = [min(tmp) + 1, max(tmp) + 1]
+    return ranks
 
-    return anime_songs, player_answers, rankings_output
+
+def get_user_ranks(username, start_date, end_date):
+
+    """
+    Ranks of username between start_date and end_date, from the rank index when one of its
+    windows holds the same days and from the player day cube otherwise.
+    Preprocessings older than the cube only have the rank index, whose shortest window
+    covering the range is used instead
+    """
+
+    rank_index, entry = cached_snapshots.load_versioned_snapshot(
+        "playerRanks", PREPROCESSED_START_DATE, index=RANK_INDEX_COLUMNS
+    )
+    windows = entry["metadata"]["windows"]
+    try:
+        last_date = snapshots.get_snapshot_entry("playerDays", PREPROCESSED_START_DATE)[
+            "metadata"
+        ]["lastDate"]
+    except FileNotFoundError:
+        last_date = None
+
+    window = get_rank_window(windows, start_date, end_date, last_date)
+    if window is None and last_date is not None:
+        return get_range_ranks(start_date, end_date).loc[username]
+    if window is None:
+        window = get_covering_window(windows, start_date, end_date)
+    return rank_index.loc[window + (username,)]
+
+
+def get_username_data(username, start_date, end_date):
+
+    try:
+        userRanks = get_user_ranks(username, start_date, end_date)
+    except KeyError:
+        return {}, {}
+
+    rankings_output = {
+        ranking: [userRanks[f"{metric}MinRank"], userRanks[f"{metric}MaxRank"]]
+        for ranking, metric in RANKING_METRICS.items()
+    }
+
+    return get_user_results(username, start_date, end_date), rankings_output
+
+
+def get_history_version():
+
+    """
+    Version of the history index, None before the preprocessing wrote it.
+    The preprocessing changes the database before the history, so both key the results
+    """
+
+    try:
+        return snapshots.get_snapshot_entry(
+            "historyIndex", None, path=snapshots.HISTORY_PATH
+        )["version"]
+    except FileNotFoundError:
+        return None
+
+
+@instrumentation.instrumented
+def get_user_results(username, start_date, end_date):
+
+    """
+    Results of every process_* function for username between start_date and end_date,
+    shared by the sessions through the result cache until the database or the history changes
+    """
+
+    key = (
+        "userResults",
+        username,
+        str(start_date),
+        str(end_date),
+        utils.get_reference_cache().database_version(),
+        get_history_version(),
+    )
+    cache = utils.get_result_cache()
+
+    results = cache.get(key)
+    if results is None:
+        # The history written by the preprocessing, the database for players it does not know
+        player_answers = snapshots.load_history(
+            username, start_date, end_date, USER_ANSWERS_COLUMNS
+        )
+        if player_answers is None:
+            player_answers = utils.extract_answers_username(
+                username, start_date, end_date, USER_ANSWERS_COLUMNS
+            )
+        results = (
+            {name: process(player_answers) for name, process in USER_RESULTS.items()}
+            if player_answers.size
+            else {}
+        )
+        cache.put(key, results)
+
+    return results
 
 
 def get_ranking_particle(ranking):
@@ -80,13 +224,28 @@ def get_ranking_particle(ranking):
         return "th"
 
 
-def plot_distribution(username, anime_songs, player_answers, start_date, end_date):
+def process_distribution(player_answers):
+
+    return {
+        "nbRanked": player_answers.rankedId.unique().size,
+        "nbSongs": player_answers.rankedSongId.size,
+        "regions": list(player_answers.region.unique()),
+        "regionCounts": player_answers.groupby("rankedId")
+        .region.unique()
+        .value_counts()
+        .values,
+        "guesses": player_answers.isCorrect.value_counts(),
+    }
+
+
+@instrumentation.instrumented
+def plot_distribution(username, distribution, start_date, end_date):
 
     st.markdown(
         f"""
     # General Information
 
-    :orange[{username}] played in :orange[{player_answers.rankedId.unique().size} ranked], and was present for :orange[{player_answers.rankedSongId.size} songs] between :orange[{start_date}] and :orange[{end_date}].
+    :orange[{username}] played in :orange[{distribution["nbRanked"]} ranked], and was present for :orange[{distribution["nbSongs"]} songs] between :orange[{start_date}] and :orange[{end_date}].
     """
     )
 
@@ -94,18 +253,14 @@ def plot_distribution(username, anime_songs, player_answers, start_date, end_dat
 
     # First pie chart
 
-    values = player_answers.groupby("rankedId").region.unique().value_counts().values
-
     fig.add_trace(
         go.Pie(
-            labels=player_answers.region.unique(),
-            values=values,
+            labels=distribution["regions"],
+            values=distribution["regionCounts"],
             title="Regions Distribution",
             domain=dict(x=[0, 0.5]),
             hole=0.5,
-            marker=dict(
-                colors=[color_map[label] for label in player_answers.region.unique()]
-            ),
+            marker=dict(colors=[color_map[label] for label in distribution["regions"]]),
             showlegend=True,
             legendgroup="group1",
             hovertemplate="Region: %{label}<br>%{value} Ranked<extra></extra>",
@@ -121,23 +276,17 @@ def plot_distribution(username, anime_songs, player_answers, start_date, end_dat
         0: {"label": "Incorrect Guess", "color": "rgb(255, 127, 127)"},
     }
 
-    values = player_answers.isCorrect.value_counts()
+    values = distribution["guesses"]
 
     fig.add_trace(
         go.Pie(
-            labels=[
-                guess_label_map[label]["label"]
-                for label in player_answers.isCorrect.value_counts().index
-            ],
+            labels=[guess_label_map[label]["label"] for label in values.index],
             values=values,
             title="Guesses Distribution",
             domain=dict(x=[0.5, 1.0]),
             hole=0.5,
             marker=dict(
-                colors=[
-                    guess_label_map[label]["color"]
-                    for label in player_answers.isCorrect.value_counts().index
-                ]
+                colors=[guess_label_map[label]["color"] for label in values.index]
             ),
             hovertemplate="%{label}<br>%{value} Guesses<extra></extra>",
             showlegend=True,
@@ -150,43 +299,25 @@ def plot_distribution(username, anime_songs, player_answers, start_date, end_dat
     st.plotly_chart(fig)
 
 
-def plot_top_n_low_pointers(username, anime_songs, player_answers, rankingSolo):
-
-    st.write("# Low Pointers")
-    st.caption(
-        f"Number of time when :orange[{username}] was one of the few to answer correctly."
-    )
+def process_low_pointers(player_answers):
 
-    st.write("")
-    nb_low = st.slider(
-        ":blue[Choose what you consider the limit to a low pointer:]", 4, 10, value=5
-    )
+    """
+    Number of correct answers and hover text of the songs for each number of
+    correct players, up to the maximum of the low pointer slider
+    """
 
-    nb_low += 1
+    correct_answers = player_answers[player_answers.isCorrect == 1]
 
-    x = (
-        player_answers[player_answers.isCorrect == 1]
-        .correctCount.value_counts()
+    occurences = (
+        correct_answers.correctCount.value_counts()
         .sort_index()
-        .reindex(list(range(1, nb_low)), fill_value=0)
+        .reindex(list(range(1, MAX_LOW_POINTER + 1)), fill_value=0)
     )
 
-    top = (
-        f"the top {rankingSolo[0]}-{rankingSolo[1]}{get_ranking_particle(rankingSolo[1])}"
-        if rankingSolo[0] != rankingSolo[1]
-        else f"top {rankingSolo[0]}"
-    )
-    st.write(
-        f":orange[{username}] got :orange[{x[1]} solo point{'s' if x[1] > 1 else ''}]. This place them in :orange[{top}] compared to everyone else!"
-    )
-
-    y = list(range(1, nb_low))
-
     lowPointSongs = (
-        player_answers[player_answers.isCorrect == 1]
-        .groupby("correctCount")
+        correct_answers.groupby("correctCount")
         .songId.apply(list)
-        .reindex(range(1, nb_low), fill_value=0)
+        .reindex(range(1, MAX_LOW_POINTER + 1), fill_value=0)
     )
 
     z = []
@@ -199,9 +330,8 @@ def plot_top_n_low_pointers(username, anime_songs, player_answers, rankingSolo):
 
         z_tmp = []
         nb_display = 10
-        for songId in rankedSongs[: min(nb_display, len(rankedSongs))]:
-            songName = anime_songs[anime_songs.songId == songId].songName.values[0]
-            songArtist = anime_songs[anime_songs.songId == songId].songArtist.values[0]
+        songs = utils.lookup_songs(rankedSongs[:nb_display], ["songName", "songArtist"])
+        for songName, songArtist in zip(songs.songName, songs.songArtist):
             songInfo = f"{songName} by {songArtist}"
             songInfo = songInfo[:70] + "..." if len(songInfo) > 70 else songInfo
             z_tmp.append(songInfo)
@@ -211,7 +341,44 @@ def plot_top_n_low_pointers(username, anime_songs, player_answers, rankingSolo):
 
         z.append("<br>".join(z_tmp))
 
+    return {"occurences": occurences, "songs": z}
+
+
+@instrumentation.instrumented
+def plot_top_n_low_pointers(username, low_pointers, rankingSolo):
+
+    st.write("# Low Pointers")
+    st.caption(
+        f"Number of time when :orange[{username}] was one of the few to answer correctly."
+    )
+
+    st.write("")
+    nb_low = st.slider(
+        ":blue[Choose what you consider the limit to a low pointer:]",
+        4,
+        MAX_LOW_POINTER,
+        value=5,
+    )
+
+    x = low_pointers["occurences"].iloc[:nb_low]
+    z = low_pointers["songs"][:nb_low]
+
+    nb_low += 1
+
+    top = (
+        f"the top {rankingSolo[0]}-{rankingSolo[1]}{get_ranking_particle(rankingSolo[1])}"
+        if rankingSolo[0] != rankingSolo[1]
+        else f"top {rankingSolo[0]}"
+    )
+    st.write(
+        f":orange[{username}] got :orange[{x[1]} solo point{'s' if x[1] > 1 else ''}]. This place them in :orange[{top}] compared to everyone else!"
+    )
+
+    y = list(range(1, nb_low))
+
     fig1 = go.Figure()
+    # Draw lines
+    fig1.add_trace(figures.lollipop_lines(x, y))
     # Draw points
     fig1.add_trace(
         go.Scatter(
@@ -225,17 +392,6 @@ def plot_top_n_low_pointers(username, anime_songs, player_answers, rankingSolo):
         )
     )
 
-    # Draw lines
-    for i, x_ in enumerate(x):
-        fig1.add_shape(
-            type="line",
-            x0=0,
-            y0=i + 1,
-            x1=x_,
-            y1=i + 1,
-            line=dict(color="crimson", width=3),
-        )
-
     fig1.update_yaxes(
         title=f"Number of correct people including {username}",
         range=[0.8, nb_low],
@@ -250,7 +406,28 @@ def plot_top_n_low_pointers(username, anime_songs, player_answers, rankingSolo):
     st.plotly_chart(fig1)
 
 
-def plot_top_n_best_ranked(username, anime_songs, player_answers, rankingScore):
+def process_top_ranked(player_answers):
+
+    """
+    Score, date and region of every ranked of the player, best ones first
+    """
+
+    topRanked = (
+        player_answers.groupby("rankedId")
+        .isCorrect.sum()
+        .sort_values(ascending=False)
+        .reset_index(name="score")
+    )
+
+    return topRanked.merge(
+        player_answers.groupby("rankedId").agg({"date": "first", "region": "first"}),
+        on="rankedId",
+        how="left",
+    )
+
+
+@instrumentation.instrumented
+def plot_top_n_best_ranked(username, top_ranked, rankingScore):
 
     st.write("# Top Ranked")
     st.caption(f":orange[{username}]'s best ranked scores.")
@@ -258,20 +435,13 @@ def plot_top_n_best_ranked(username, anime_songs, player_answers, rankingScore):
     st.write("")
     nb_top = st.slider(":blue[Number of ranked to display:]", 3, 30, value=10)
 
-    if nb_top > player_answers.rankedId.unique().size:
+    if nb_top > len(top_ranked):
         st.error(
-            f"{username} only played :orange[{player_answers.rankedId.unique().size}] ranked in that period. Defaulting to :orange[{player_answers.rankedId.unique().size}]"
+            f"{username} only played :orange[{len(top_ranked)}] ranked in that period. Defaulting to :orange[{len(top_ranked)}]"
         )
-        nb_top = player_answers.rankedId.unique().size
-
-    topRanked = (
-        player_answers.groupby("rankedId")
-        .isCorrect.sum()
-        .sort_values(ascending=False)
-        .reset_index(name="score")
-    )
+        nb_top = len(top_ranked)
 
-    topRanked = topRanked.head(nb_top).sort_values(by=["score"], ascending=False)
+    topRanked = top_ranked.head(nb_top).sort_values(by=["score"], ascending=False)
 
     top = (
         f"the top {rankingScore[0]}-{rankingScore[1]}{get_ranking_particle(rankingScore[1])}"
@@ -282,12 +452,9 @@ def plot_top_n_best_ranked(username, anime_songs, player_answers, rankingScore):
         f":orange[{username}]'s best ranked is :orange[{topRanked.iloc[0].score} points]. This place them in :orange[{top}] compared to everyone else!"
     )
 
-    topRanked = topRanked.merge(
-        player_answers.groupby("rankedId").agg({"date": "first", "region": "first"}),
-        on="rankedId",
-        how="left",
-    )
-    customdata = [[x, y] for x, y in zip(topRanked.date, topRanked.region)]
+    customdata = [
+        [x, y] for x, y in zip(topRanked.date.dt.strftime("%Y-%m-%d"), topRanked.region)
+    ]
 
     fig1 = px.bar(topRanked, x="score", y=list(range(1, nb_top + 1)), orientation="h")
 
@@ -307,9 +474,97 @@ def plot_top_n_best_ranked(username, anime_songs, player_answers, rankingScore):
     st.plotly_chart(fig1)
 
 
-def plot_performances_over_time(
-    username, anime_songs, player_answers, start_date, end_date, rankingTime
-):
+def process_play_time(player_answers):
+
+    """
+    Number of songs and guess rate of the player per day and region
+    """
+
+    return {
+        "nbSongs": player_answers.isCorrect.size,
+        "firstDay": player_answers.date.min().date(),
+        "lastDay": player_answers.date.max().date(),
+        # Legend order of the raw answers
+        "regions": list(player_answers.region.unique()),
+        "songsPerDay": player_answers.groupby(["date", "region"], observed=True)
+        .size()
+        .reset_index(name="nbSongs"),
+        "guessRates": player_answers.groupby(["date", "region"], observed=True)
+        .isCorrect.mean()
+        .apply(lambda x: round(x, 4) * 100)
+        .reset_index(name="guessRate"),
+    }
+
+
+def bin_over_time(per_day, column, first_day, last_day, nbins, average=False):
+
+    """
+    Split first_day - last_day in at most nbins bins of whole days, and sum (or average)
+    column of the days of each region falling in each bin.
+    Return the start of the bins, their width in days and the values of each region
+    """
+
+    nb_day = (last_day - first_day).days + 1
+    width = -(-nb_day // max(nbins, 1))
+    nb_bin = -(-nb_day // width)
+    starts = pd.Timestamp(first_day) + pd.to_timedelta(np.arange(nb_bin) * width, "D")
+
+    bins = (per_day.date - pd.Timestamp(first_day)).dt.days.to_numpy() // width
+    regions = per_day.region.to_numpy()
+    values = per_day[column].to_numpy(dtype=float)
+
+    region_values = {}
+    for region in pd.unique(regions):
+        mask = regions == region
+        sums = np.bincount(bins[mask], weights=values[mask], minlength=nb_bin)
+        counts = np.bincount(bins[mask], minlength=nb_bin)
+        region_values[region] = (
+            np.divide(sums, counts, out=np.full(nb_bin, np.nan), where=counts > 0)
+            if average
+            else np.where(counts > 0, sums, np.nan)
+        )
+
+    return starts, width, region_values
+
+
+@instrumentation.instrumented
+def plot_binned_over_time(starts, width, region_values, regions, hovertemplate):
+
+    """
+    One bar per bin of each region, skipping the bins without any day played
+    """
+
+    ends = starts + pd.Timedelta(days=width - 1)
+    labels = np.array(
+        [
+            f"{s:%b %d, %Y}" if width == 1 else f"{s:%b %d} - {e:%b %d, %Y}"
+            for s, e in zip(starts, ends)
+        ]
+    )
+    centers = starts + pd.Timedelta(days=width / 2)
+
+    fig = go.Figure()
+    for region in regions:
+        values = region_values.get(region)
+        if values is None:
+            continue
+        played = ~np.isnan(values)
+        fig.add_trace(
+            go.Bar(
+                name=region,
+                x=centers[played],
+                y=values[played],
+                customdata=labels[played],
+                hovertemplate=hovertemplate,
+                marker_color=color_map[region],
+            )
+        )
+
+    return fig
+
+
+@instrumentation.instrumented
+def plot_performances_over_time(username, play_time, start_date, end_date, rankingTime):
 
     st.write("# Play Time")
 
@@ -320,18 +575,12 @@ def plot_performances_over_time(
     )
 
     st.write(
-        f":orange[{username}] spent approximately :orange[{round(player_answers.isCorrect.size / 2 / 60)} hours] playing ranked. This place them in :orange[{top}] compared to everyone else!"
+        f":orange[{username}] spent approximately :orange[{round(play_time['nbSongs'] / 2 / 60)} hours] playing ranked. This place them in :orange[{top}] compared to everyone else!"
     )
 
-    last_day = max(
-        end_date,
-        datetime.datetime.strptime(np.max(player_answers.date), "%Y-%m-%d").date(),
-    )
+    last_day = max(end_date, play_time["lastDay"])
 
-    first_day = min(
-        start_date,
-        datetime.datetime.strptime(np.min(player_answers.date), "%Y-%m-%d").date(),
-    )
+    first_day = min(start_date, play_time["firstDay"])
 
     nb_day = (last_day - first_day).days
 
@@ -350,35 +599,27 @@ def plot_performances_over_time(
     )
     periodBin = int(period_map[periodBin])
 
-    fig = px.histogram(
-        player_answers,
-        x="date",
-        color="region",
-        color_discrete_map=color_map,
-        nbins=periodBin,
+    # Binned here so only the bars are sent to the browser, not every day played
+    fig = plot_binned_over_time(
+        *bin_over_time(
+            play_time["songsPerDay"], "nbSongs", first_day, last_day, periodBin
+        ),
+        play_time["regions"],
+        "%{customdata}<br>%{y} songs",
     )
-    fig.update_layout(bargap=0.2, hovermode="x unified")
+    fig.update_layout(bargap=0.2, hovermode="x unified", barmode="stack")
     fig.update_yaxes(title=f"Number of songs played")
     fig.update_xaxes(title="Date")
     st.plotly_chart(fig)
 
     st.write("### Guess Rate over time")
 
-    df = (
-        player_answers.groupby(["date", "region"])
-        .isCorrect.mean()
-        .apply(lambda x: round(x, 4) * 100)
-        .reset_index(name="guessRate")
-    )
+    df = play_time["guessRates"]
 
-    fig = px.histogram(
-        df,
-        x="date",
-        y="guessRate",
-        color="region",
-        color_discrete_map=color_map,
-        nbins=periodBin,
-        histfunc="avg",
+    fig = plot_binned_over_time(
+        *bin_over_time(df, "guessRate", first_day, last_day, periodBin, average=True),
+        play_time["regions"],
+        "%{customdata}<br>%{y:.2f}%",
     )
     fig.update_layout(bargap=0.3, hovermode="x unified", barmode="group")
 
@@ -392,9 +633,7 @@ def plot_performances_over_time(
     st.plotly_chart(fig)
 
 
-def plot_worst_songs(username, anime_songs, player_answers):
-    st.write("# Songs missed more than once")
-    st.write(f"Please, learn those songs already...")
+def process_missed_songs(player_answers):
 
     songIds = (
         player_answers[player_answers.isCorrect == 0]
@@ -405,9 +644,17 @@ def plot_worst_songs(username, anime_songs, player_answers):
         .rename(columns={"isCorrect": "nb_miss"})
     )
 
-    missed = anime_songs.merge(songIds, how="right")[songIds.nb_miss > 1][
-        ["nb_miss", "songName", "songArtist"]
-    ]
+    missed = songIds[songIds.nb_miss > 1]
+    songs = utils.lookup_songs(missed.songId, ["songName", "songArtist"])
+    return missed.assign(
+        songName=songs.songName.values, songArtist=songs.songArtist.values
+    )[["nb_miss", "songName", "songArtist"]]
+
+
+@instrumentation.instrumented
+def plot_worst_songs(username, missed):
+    st.write("# Songs missed more than once")
+    st.write(f"Please, learn those songs already...")
 
     if missed.empty:
         st.success(f":orange[{username}] never missed the same song more than once")
@@ -417,6 +664,16 @@ def plot_worst_songs(username, anime_songs, player_answers):
     return
 
 
+# Results computed from the answers of the user, cached together
+USER_RESULTS = {
+    "distribution": process_distribution,
+    "lowPointers": process_low_pointers,
+    "topRanked": process_top_ranked,
+    "playTime": process_play_time,
+    "missedSongs": process_missed_songs,
+}
+
+
 def initialize():
 
     st.set_page_config(
@@ -466,26 +723,24 @@ def initialize():
         st.error("Error: End date must fall after start date.")
         return False, False, False
 
-    anime_songs, player_answers, rankings = get_username_data(
-        username, start_date, end_date
-    )
+    results, rankings = get_username_data(username, start_date, end_date)
 
-    if player_answers.size == 0:
+    if not results:
         swap = username if not re.match("^ +$", username) else "this username"
         st.error(f"No data for :orange[{swap}] in the specified time period.")
     else:
-        plot_distribution(username, anime_songs, player_answers, start_date, end_date)
-        plot_top_n_low_pointers(username, anime_songs, player_answers, rankings["solo"])
-        plot_top_n_best_ranked(username, anime_songs, player_answers, rankings["score"])
+        plot_distribution(username, results["distribution"], start_date, end_date)
+        plot_top_n_low_pointers(username, results["lowPointers"], rankings["solo"])
+        plot_top_n_best_ranked(username, results["topRanked"], rankings["score"])
         plot_performances_over_time(
             username,
-            anime_songs,
-            player_answers,
+            results["playTime"],
             start_date,
             end_date,
             rankings["time"],
         )
-        plot_worst_songs(username, anime_songs, player_answers)
+        plot_worst_songs(username, results["missedSongs"])
 
 
-initialize()
+with instrumentation.instrumented_rerun("Ranked - Specific User"):
+    initialize()
@@ -8,13 +8,106 @@ Probably possible to optimize stuff, and need to use sql requests more to not lo
 import pandas as pd
 from pathlib import Path
 import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
 import utils
+import snapshots
+import figures
 import datetime
+import argparse
+import os
+import time
+import tempfile
+import multiprocessing
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 
 DATA_RAW_PATH = Path("data/raw/")
+AGGREGATES_PATH = Path("data/aggregates/")
 
+PLAYERS_ANSWERS_SELECT = """
+    SELECT rankeds_games.rankedId, rankeds_games.date, rankeds_games.region, rankeds_games.rankedSongId, rankeds_games.rankedSongNumber, rankeds_games.songId, rankeds_games.startTime, rankeds_games.correctCount, rankeds_games.activePlayers,
+    players_answers_tmp.playerId, players_answers_tmp.playerName, players_answers_tmp.animeId, players_answers_tmp.guessTime, players_answers_tmp.isCorrect
+    FROM players_answers_tmp
+    LEFT JOIN rankeds_games ON rankeds_games.rankedSongId = players_answers_tmp.rankedSongId
+"""
+
+PLAYERS_ANSWERS_INDEXES = {
+    "players_answers_player_date": "playerName, date",
+    "players_answers_song": "songId",
+    "players_answers_ranked": "rankedId",
+    "players_answers_date_region": "date, region",
+}
+
+
+# Aggregation backends of main, "sql" running the GROUP BYs inside SQLite
+BACKENDS = ["pandas", "sql"]
 
-def fuse_tables(cursor):
+# Per game totals of each player, the day cube of the players
+SQL_PLAYER_DAYS = """
+    SELECT date, region, playerName, SUM(isCorrect) AS score, COUNT(isCorrect) AS total, SUM(isCorrect = 1 AND correctCount = 1) AS nbSoloPoints
+    FROM players_answers
+    WHERE rankedId IS NOT NULL AND playerName IS NOT NULL AND date BETWEEN ? AND ?
+    GROUP BY date, region, playerName
+"""
+
+# Kept in a temporary table for the queries below
+SQL_PLAYER_GAMES = "CREATE TEMP TABLE player_games AS" + SQL_PLAYER_DAYS
+
+SQL_PLAYER_STATS = """
+    SELECT playerName, region, nbSongs, MAX(bestScore) OVER player AS bestScore, SUM(nbSoloPoints) OVER player AS nbSoloPoints, SUM(nbSongs) OVER player AS totalSongs
+    FROM (
+        SELECT playerName, region, SUM(total) AS nbSongs, MAX(score) AS bestScore, SUM(nbSoloPoints) AS nbSoloPoints
+        FROM temp.player_games
+        GROUP BY playerName, region
+    )
+    WINDOW player AS (PARTITION BY playerName)
+"""
+
+SQL_BEST_PLAYER_GAMES = """
+    SELECT date, region, playerName, score, total, nbSoloPoints
+    FROM (
+        SELECT *, MAX(score) OVER (PARTITION BY playerName) AS bestScore
+        FROM temp.player_games
+    )
+    WHERE score = bestScore
+"""
+
+SQL_TOP_REGIONS = """
+    WITH games AS (
+        SELECT region, COUNT(*) AS nbPlayers FROM temp.player_games GROUP BY date, region
+    ),
+    players AS (
+        SELECT region, SUM(score) * 1.0 / SUM(total) * 100 AS guessRate
+        FROM temp.player_games
+        GROUP BY region, playerName
+        HAVING SUM(total) >= 850
+    ),
+    ranked_players AS (
+        SELECT region, guessRate, ROW_NUMBER() OVER (PARTITION BY region ORDER BY guessRate DESC) AS rank
+        FROM players
+    )
+    SELECT region, playerCount, playerAverage, averageGuessRate
+    FROM (SELECT region, COUNT(DISTINCT playerName) AS playerCount FROM temp.player_games GROUP BY region)
+    JOIN (SELECT region, AVG(nbPlayers) AS playerAverage FROM games GROUP BY region) USING (region)
+    LEFT JOIN (SELECT region, AVG(guessRate) AS averageGuessRate FROM ranked_players WHERE rank <= 150 GROUP BY region) USING (region)
+"""
+
+# Per game totals of each song, the day cube of the songs
+SQL_SONG_DAYS = """
+    SELECT date, region, songId, COUNT(DISTINCT rankedId) AS playCount, COUNT(isCorrect) AS playerCount, SUM(isCorrect) AS nbCorrect
+    FROM players_answers
+    WHERE rankedId IS NOT NULL AND songId IS NOT NULL AND date BETWEEN ? AND ?
+    GROUP BY date, region, songId
+"""
+
+
+def fuse_tables(cursor, materialize=False):
+
+    """
+    Create the views used by the app, players_answers being either a view
+    or a materialized table when materialize is True
+    """
 
     utils.run_sql_command(cursor, "DROP VIEW IF EXISTS anime_songs")
     command = """
@@ -43,277 +136,1166 @@ def fuse_tables(cursor):
     """
     utils.run_sql_command(cursor, command)
 
-    utils.run_sql_command(cursor, "DROP VIEW IF EXISTS players_answers")
-    command = """
-    CREATE VIEW players_answers AS
-    SELECT rankeds_games.rankedId, rankeds_games.date, rankeds_games.region, rankeds_games.rankedSongId, rankeds_games.rankedSongNumber, rankeds_games.songId, rankeds_games.startTime, rankeds_games.correctCount, rankeds_games.activePlayers,
-    players_answers_tmp.playerId, players_answers_tmp.playerName, players_answers_tmp.animeId, players_answers_tmp.guessTime, players_answers_tmp.isCorrect
-    FROM players_answers_tmp
-    LEFT JOIN rankeds_games ON rankeds_games.rankedSongId = players_answers_tmp.rankedSongId;
+    if materialize:
+        materialize_players_answers(cursor)
+    else:
+        drop_relation(cursor, "players_answers")
+        utils.run_sql_command(
+            cursor, f"CREATE VIEW players_answers AS {PLAYERS_ANSWERS_SELECT};"
+        )
+
+
+def get_relation_type(cursor, name):
+
     """
-    utils.run_sql_command(cursor, command)
+    Return "table", "view" or None depending on what name currently is in the database
+    """
+
+    record = utils.run_sql_command(
+        cursor, "SELECT type FROM sqlite_master WHERE name = ?", (name,)
+    )
+    return record[0][0] if record else None
+
+
+def drop_relation(cursor, name):
+
+    """
+    Drop name whether it is a view or a table
+    """
+
+    relation_type = get_relation_type(cursor, name)
+    if relation_type in ("table", "view"):
+        utils.run_sql_command(cursor, f"DROP {relation_type.upper()} {name}")
+
+
+def materialize_players_answers(cursor):
+
+    """
+    Store players_answers as a denormalized and indexed table instead of a view,
+    only inserting the answers of the ranked games added since the last call
+    """
+
+    if get_relation_type(cursor, "players_answers") != "table":
+        drop_relation(cursor, "players_answers")
+        utils.run_sql_command(
+            cursor,
+            f"CREATE TABLE players_answers AS {PLAYERS_ANSWERS_SELECT} WHERE 0;",
+        )
+        for name, columns in PLAYERS_ANSWERS_INDEXES.items():
+            utils.run_sql_command(
+                cursor, f"CREATE INDEX {name} ON players_answers ({columns})"
+            )
+
+    # Ranked games ids only go up, so everything above the current max is new
+    utils.run_sql_command(
+        cursor,
+        f"""
+        INSERT INTO players_answers {PLAYERS_ANSWERS_SELECT}
+        WHERE rankeds_games.rankedId > (SELECT IFNULL(MAX(rankedId), 0) FROM players_answers);
+        """,
+    )
+    cursor.connection.commit()
 
 
 def process_top_player_df(players_answers, start_date, end_date, nbDisplay):
 
-    players_answers = players_answers[players_answers.date >= str(start_date)]
-    players_answers = players_answers[players_answers.date <= str(end_date)]
+    players_answers = filter_dates(players_answers, start_date, end_date)
 
-    topSolo = (
-        players_answers.query("isCorrect == 1 & correctCount == 1")
-        .groupby("playerName")
-        .rankedSongId.size()
-        .reset_index(name="nbSoloPoints")
-        .sort_values(by=["nbSoloPoints"], ascending=False)
+    return process_top_player_games(
+        aggregate_player_games(players_answers), start_date, end_date, nbDisplay
     )
 
-    df = (
-        players_answers.groupby(["date", "region", "playerName"])
-        .isCorrect.mean()
+
+def aggregate_player_stats(player_games):
+
+    """
+    One row per player and region with the number of songs played in that region,
+    along with the total number of songs, best score and solo points of the player
+    """
+
+    stats = (
+        player_games.groupby(["playerName", "region"], observed=True)
+        .agg(
+            nbSongs=("total", "sum"),
+            bestScore=("score", "max"),
+            nbSoloPoints=("nbSoloPoints", "sum"),
+        )
         .reset_index()
     )
 
-    grouped_df = players_answers.groupby(["date", "region", "playerName"])
+    players = stats.groupby("playerName", observed=True)
+    stats["totalSongs"] = players.nbSongs.transform("sum")
+    stats["bestScore"] = players.bestScore.transform("max")
+    stats["nbSoloPoints"] = players.nbSoloPoints.transform("sum")
+
+    return stats
+
 
-    df["score"] = grouped_df.isCorrect.sum().values
-    df["total"] = grouped_df.isCorrect.count().values
+def best_player_games(player_games):
 
-    idx = df.groupby("playerName").score.transform(max) == df.score
+    """
+    Games in which each player got their best score
+    """
 
-    topScore = df[idx].sort_values(by=["score"], ascending=False)
+    idx = player_games.score == player_games.groupby(
+        "playerName", observed=True
+    ).score.transform("max")
 
-    # Group the data by playerName and region, and calculate the sum of the total column
-    df_grouped = df.groupby(["playerName", "region"], as_index=False).total.sum()
+    return player_games[idx]
 
-    # Group the data by playerName and calculate the sum of the total column
-    df_totals = df_grouped.groupby("playerName", as_index=False).total.sum()
 
-    # Merge df_totals with df_grouped on the playerName column
-    df_merged = df_totals.merge(df_grouped, on="playerName", how="left")
+def rank_top_players(best_games, stats, nbDisplay):
 
-    # Sort the data by total_x in descending order and reset the index
-    df_merged = df_merged.sort_values(by=["total_x"], ascending=False).reset_index(
-        drop=True
+    """
+    Build the top score, top time and top solo tables from the best games
+    and the player stats, keeping the nbDisplay first players (all of them if 0)
+    """
+
+    topScore = best_games.sort_values(by=["score"], ascending=False)
+
+    topTime = (
+        stats[["playerName", "totalSongs", "region", "nbSongs"]]
+        .sort_values(by=["totalSongs"], ascending=False)
+        .reset_index(drop=True)
     )
 
-    # Select the top nb_display rows
-    head_id = df_merged[df_merged.playerName != df_merged.playerName.shift()].index[
-        nbDisplay + 2
-    ]
+    players = stats.drop_duplicates("playerName")
+    topSolo = players[players.nbSoloPoints > 0][
+        ["playerName", "nbSoloPoints"]
+    ].sort_values(by=["nbSoloPoints"], ascending=False)
 
     if nbDisplay:
-        topTime = df_merged.iloc[3:head_id].rename(columns={"total_y": "nbSongs"})
-        # print(topScore)
+        # Rows of the nbDisplay first players, skipping the first 3
+        player_rows = topTime[topTime.playerName != topTime.playerName.shift()].index
+        head_id = (
+            player_rows[nbDisplay + 2]
+            if len(player_rows) > nbDisplay + 2
+            else len(topTime)
+        )
+        topTime = topTime.iloc[3:head_id]
         topScore = topScore.iloc[:nbDisplay][
             ["date", "region", "playerName", "score"]
         ].drop_duplicates("playerName")
         topScore.index = np.arange(1, len(topScore) + 1)
         return topScore, topTime, topSolo.iloc[:nbDisplay]
     else:
-        topTime = df_merged.rename(columns={"total_y": "nbSongs"})
         topScore.index = np.arange(1, len(topScore) + 1)
         return topScore, topTime, topSolo
 
 
-def count_unique_players(x):
-    return len(x.playerName.unique())
+def process_top_regions(players_answers, start_date, end_date):
+
+    players_answers = filter_dates(players_answers, start_date, end_date)
 
+    # Every region stat comes from the per game totals of each player
+    return process_top_regions_games(
+        aggregate_player_games(players_answers), start_date, end_date
+    )
 
-def mean_correct_guess_rate(x):
 
-    eligible = x.groupby("playerName").isCorrect.count().reset_index(name="songCount")
-    eligible = eligible[eligible.songCount >= 850]
+def process_top_anime_songs(
+    players_answers, anime_songs, start_date, end_date, nbDisplay
+):
 
-    pGuessRate = x.groupby("playerName").isCorrect.mean().reset_index(name="guessRate")
-    pGuessRate = pGuessRate[pGuessRate.playerName.isin(eligible.playerName)].apply(
-        lambda x: x * 100
+    songs = (
+        players_answers.groupby("songId")
+        .agg(
+            playCount=("rankedId", "nunique"),
+            playerCount=("isCorrect", "count"),
+            nbCorrect=("isCorrect", "sum"),
+        )
+        .astype({"nbCorrect": "int64"})
+        .reset_index()
     )
 
-    return (
-        pGuessRate.sort_values(by=["guessRate"], ascending=False)
-        .head(150)
-        .guessRate.mean()
-        .round(2)
+    return rank_song_totals(songs, anime_songs, nbDisplay)
+
+
+def rank_top_songs(playCount, playerCount, guessRate, anime_songs, nbDisplay):
+
+    """
+    Build the spam anime, spam songs, easy songs and hard songs tables
+    from the play count, player count and guess rate of each songId
+    """
+
+    merged_df = (
+        pd.merge(playCount, playerCount[playerCount.playerCount > 100], on="songId")
+        .merge(guessRate, on="songId")
+        .merge(
+            anime_songs[["songId", "animeName", "songName", "songArtist"]],
+            on="songId",
+        )
     )
 
+    # Only built for the songs played enough, anime_songs being shared through the reference cache
+    songInfo = merged_df.songName + " by " + merged_df.songArtist
 
-def process_top_regions(players_answers, start_date, end_date):
+    topSpamAnime = (
+        merged_df.groupby("animeName")
+        .playCount.sum()
+        .reset_index()
+        .sort_values(by=["playCount"], ascending=False)
+        .head(nbDisplay)
+    )
 
-    players_answers = players_answers[players_answers.date >= str(start_date)]
-    players_answers = players_answers[players_answers.date <= str(end_date)]
+    # Songs sharing the same name and artist are counted together, sorted by songInfo
+    songKey, songInfos = pd.factorize(songInfo, sort=True)
+    songs = merged_df.groupby(songKey)
+    songs_df = pd.DataFrame(
+        {
+            "songInfo": songInfos,
+            "playCount": songs.playCount.sum().to_numpy(),
+            "playerCount": songs.playerCount.sum().to_numpy(),
+            "guessRate": songs.guessRate.mean().to_numpy(),
+            "songName": songs.songName.first().to_numpy(),
+        }
+    )
 
-    # Create a dataframe with the total number of unique players per region
-    top_regions = (
-        players_answers.groupby("region")
-        .apply(count_unique_players)
-        .rename("playerCount")
+    topSpamSongs = songs_df.sort_values(by=["playCount"], ascending=False).head(
+        nbDisplay
+    )
+    topEasySongs = (
+        songs_df[songs_df.playCount > 1]
+        .sort_values(by=["guessRate"], ascending=False)
+        .head(nbDisplay)
+    )
+    topHardSongs = (
+        songs_df[songs_df.playCount > 2].sort_values(by=["guessRate"]).head(nbDisplay)
+    )
+
+    # Anime of the songs that made it to the tables only
+    shown = np.unique(
+        np.concatenate([topSpamSongs.index, topEasySongs.index, topHardSongs.index])
+    )
+    animeNames = (
+        merged_df.animeName[np.isin(songKey, shown)]
+        .groupby(songKey[np.isin(songKey, shown)])
+        .unique()
+    )
+
+    return topSpamAnime, *[
+        top.assign(animeName=animeNames.loc[top.index].to_numpy())
+        for top in [topSpamSongs, topEasySongs, topHardSongs]
+    ]
+
+
+def aggregate_player_games(players_answers):
+
+    """
+    Score, number of songs and solo points of each player for each ranked game
+    """
+
+    # NULL answers are neither scored nor counted, as with SUM and COUNT in SQL
+    solo = (players_answers.isCorrect == 1) & (players_answers.correctCount == 1)
+
+    return (
+        players_answers.assign(nbSoloPoints=solo.fillna(False).astype(int))
+        .groupby(["date", "region", "playerName"], observed=True)
+        .agg(
+            score=("isCorrect", "sum"),
+            total=("isCorrect", "count"),
+            nbSoloPoints=("nbSoloPoints", "sum"),
+        )
+        .astype({"score": "int64"})
         .reset_index()
     )
 
-    # Create a dataframe with the mean number of unique players per date and region
-    average_players = (
-        players_answers.groupby(["date", "region"])
-        .apply(count_unique_players)
-        .rename("playerCount")
+
+def aggregate_song_games(players_answers):
+
+    """
+    Number of ranked, answers and correct answers of each song for each ranked game
+    """
+
+    return (
+        players_answers.groupby(["date", "region", "songId"], observed=True)
+        .agg(
+            playCount=("rankedId", "nunique"),
+            playerCount=("isCorrect", "count"),
+            nbCorrect=("isCorrect", "sum"),
+        )
+        .astype({"nbCorrect": "int64"})
         .reset_index()
     )
 
-    # Create a dataframe with the mean player count per region
+
+def merge_aggregates(previous, new, keys):
+
+    """
+    Fold new partial aggregates into the previous ones, every value being a sum
+    """
+
+    if previous is None or previous.empty:
+        return new
+    if new.empty:
+        return previous
+
+    return pd.concat([previous, new]).groupby(keys, observed=True).sum().reset_index()
+
+
+def filter_dates(df, start_date, end_date):
+
+    return df[(df.date >= str(start_date)) & (df.date <= str(end_date))]
+
+
+def process_top_player_games(player_games, start_date, end_date, nbDisplay):
+
+    """
+    Same as process_top_player_df, from the per game aggregates
+    """
+
+    player_games = filter_dates(player_games, start_date, end_date)
+
+    return rank_top_players(
+        best_player_games(player_games), aggregate_player_stats(player_games), nbDisplay
+    )
+
+
+def process_top_regions_games(player_games, start_date, end_date):
+
+    """
+    Playerbase and guess rate of each region, from the per game aggregates
+    """
+
+    player_games = filter_dates(player_games, start_date, end_date)
+
+    # Total number of unique players per region
+    top_regions = (
+        player_games.groupby("region", observed=True)
+        .playerName.nunique()
+        .reset_index(name="playerCount")
+    )
+
+    # Mean number of players per game, a row being one player in one game
     mean_player_count = (
-        average_players.groupby("region")
-        .playerCount.mean()
+        player_games.groupby(["date", "region"], observed=True)
+        .size()
+        .groupby("region", observed=True)
+        .mean()
         .round()
         .reset_index(name="playerAverage")
     )
 
-    # Create a dataframe with the mean correct guess rate for the top 100 players of each region
+    # Mean guess rate of the top 150 players of each region with at least 850 songs
+    players = player_games.groupby(["region", "playerName"], observed=True)[
+        ["score", "total"]
+    ].sum()
+    players = players[players.total >= 850]
+    players["guessRate"] = players.score / players.total * 100
+
     mean_guess_rates = (
-        players_answers.groupby("region")
-        .apply(mean_correct_guess_rate)
+        players.sort_values(by=["guessRate"], ascending=False)
+        .groupby("region", observed=True)
+        .head(150)
+        .groupby("region", observed=True)
+        .guessRate.mean()
+        .round(2)
         .reset_index(name="averageGuessRate")
     )
 
-    # Merge the dataframes
-    merged_df = pd.merge(top_regions, mean_player_count, on="region").merge(
-        mean_guess_rates, on="region"
+    return top_regions.merge(mean_player_count, on="region").merge(
+        mean_guess_rates, on="region", how="left"
     )
 
-    return merged_df
 
+def process_top_song_games(song_games, anime_songs, start_date, end_date, nbDisplay):
 
-def process_top_anime_songs(
-    players_answers, anime_songs, start_date, end_date, nbDisplay
-):
+    """
+    Same as process_top_anime_songs, from the per game aggregates
+    """
 
-    playCount = (
-        players_answers.groupby(["songId"])
-        .rankedId.unique()
-        .apply(lambda x: len(x))
-        .reset_index(name="playCount")
+    songs = (
+        filter_dates(song_games, start_date, end_date)
+        .groupby("songId")[["playCount", "playerCount", "nbCorrect"]]
+        .sum()
+        .reset_index()
     )
 
-    playerCount = (
-        players_answers.groupby("songId")
-        .isCorrect.count()
-        .reset_index(name="playerCount")
+    return rank_song_totals(songs, anime_songs, nbDisplay)
+
+
+def rank_song_totals(songs, anime_songs, nbDisplay):
+
+    """
+    Same as rank_top_songs, from the play count, player count and number of correct answers of each songId
+    """
+
+    guessRate = songs[["songId"]].assign(
+        guessRate=(songs.nbCorrect / songs.playerCount * 100).round(2)
     )
 
-    guessRate = (
-        players_answers.groupby("songId")
-        .isCorrect.mean()
-        .apply(lambda x: x * 100)
-        .round(2)
-        .reset_index(name="guessRate")
+    return rank_top_songs(
+        songs[["songId", "playCount"]],
+        songs[["songId", "playerCount"]],
+        guessRate,
+        anime_songs,
+        nbDisplay,
     )
 
-    anime_songs["songInfo"] = anime_songs.songName + " by " + anime_songs.songArtist
 
-    merged_df = (
-        pd.merge(playCount, playerCount[playerCount.playerCount > 100], on="songId")
-        .merge(guessRate, on="songId")
+# Metrics the songs and anime can be ranked by in query_top_songs
+SONG_METRICS = ["playCount", "playerCount", "guessRate"]
+
+
+def query_top_songs(
+    song_days,
+    anime_songs,
+    metric="playCount",
+    nbDisplay=20,
+    ascending=False,
+    start_date=None,
+    end_date=None,
+    regions=None,
+    min_player_count=0,
+    min_play_count=0,
+    by="song",
+):
+
+    """
+    nbDisplay songs (or anime when by is "anime") with the highest metric, the lowest if ascending,
+    from the per day song totals of the regions between start_date and end_date.
+    Only the songs with at least min_player_count answers and min_play_count plays are kept,
+    songs sharing the same name and artist being counted together
+    """
+
+    days = song_days
+    if start_date is not None:
+        days = days[days.date >= str(start_date)]
+    if end_date is not None:
+        days = days[days.date <= str(end_date)]
+    if regions:
+        days = days[days.region.isin(regions)]
+
+    songs = (
+        days.groupby("songId")[["playCount", "playerCount", "nbCorrect"]]
+        .sum()
+        .reset_index()
         .merge(
-            anime_songs[["songId", "animeName", "songName", "songInfo"]], on="songId"
+            anime_songs[["songId", "animeName", "songName", "songArtist"]], on="songId"
         )
     )
+    totals = ["playCount", "playerCount", "nbCorrect"]
 
-    topSpamAnime = (
-        merged_df.groupby("animeName")
-        .playCount.sum()
-        .reset_index()
-        .sort_values(by=["playCount"], ascending=False)
+    if by == "anime":
+        top = songs.groupby("animeName")[totals].sum().reset_index()
+    else:
+        songs["songInfo"] = songs.songName + " by " + songs.songArtist
+        top = (
+            songs.groupby("songInfo")
+            .agg(
+                playCount=("playCount", "sum"),
+                playerCount=("playerCount", "sum"),
+                nbCorrect=("nbCorrect", "sum"),
+                songName=("songName", "first"),
+            )
+            .reset_index()
+        )
+
+    top = top[(top.playerCount >= min_player_count) & (top.playCount >= min_play_count)]
+    top = (
+        top.assign(guessRate=(top.nbCorrect / top.playerCount * 100).round(2))
+        .drop(columns=["nbCorrect"])
+        .sort_values(by=[metric], ascending=ascending)
         .head(nbDisplay)
+        .reset_index(drop=True)
     )
 
-    merged_df = (
-        merged_df.groupby(["songInfo"])
-        .agg(
-            {
-                "playCount": "sum",
-                "playerCount": "sum",
-                "guessRate": "mean",
-                "songName": "first",
-                "animeName": lambda x: x,
-            }
+    if by != "anime":
+        # Anime of the songs that made it to the top only
+        shown = songs[songs.songInfo.isin(top.songInfo)]
+        animeNames = shown.groupby("songInfo").animeName.unique()
+        top["animeName"] = animeNames.loc[top.songInfo].to_numpy()
+
+    return top
+
+
+# Name of each aggregate, with the function computing it and its keys
+AGGREGATES = {
+    "playerGames": (aggregate_player_games, ["date", "region", "playerName"]),
+    "songGames": (aggregate_song_games, ["date", "region", "songId"]),
+}
+
+
+def get_aggregates_last_ranked_ids(path=AGGREGATES_PATH):
+
+    """
+    Last rankedId contained in each aggregate, 0 for the aggregates never written
+    """
+
+    manifest = snapshots.read_manifest(path)["snapshots"]
+    return {
+        name: manifest[name]["metadata"]["lastRankedId"] if name in manifest else 0
+        for name in AGGREGATES
+    }
+
+
+def update_aggregates(new_answers, path=AGGREGATES_PATH):
+
+    """
+    Fold the answers of the ranked games played since the last run into the
+    per game aggregates, each aggregate keeping the last rankedId it contains
+    """
+
+    manifest = snapshots.read_manifest(path)["snapshots"]
+    lastRankedIds = get_aggregates_last_ranked_ids(path)
+
+    aggregates = {}
+    for name, (aggregate, keys) in AGGREGATES.items():
+
+        previous = (
+            snapshots.load_snapshot(name, None, path=path) if name in manifest else None
         )
-        .reset_index()
+        # new_answers may start before this aggregate when the history is behind it
+        batch = new_answers[new_answers.rankedId > lastRankedIds[name]]
+        if batch.empty:
+            aggregates[name] = previous
+            continue
+
+        aggregates[name] = merge_aggregates(previous, aggregate(batch), keys)
+        snapshots.write_snapshot(
+            aggregates[name],
+            name,
+            None,
+            path=path,
+            metadata={"lastRankedId": int(new_answers.rankedId.max())},
+        )
+
+    return aggregates["playerGames"], aggregates["songGames"]
+
+
+def read_sql_frame(cursor, sql_command, data=None):
+
+    """
+    Run the query and cast the answers columns of its result to ANSWERS_SCHEMA
+    """
+
+    results = utils.run_sql_command(cursor, sql_command, data)
+    columns = [description[0] for description in cursor.description]
+    return utils.apply_answers_schema(pd.DataFrame(results, columns=columns))
+
+
+def aggregate_players_sql(cursor, start_date, end_date):
+
+    """
+    Player stats, best games of each player, region stats and the player day cube computed inside SQLite,
+    in the same order as with pandas. The temporary table needs a read-write connection
+    """
+
+    dates = (str(start_date), str(end_date))
+    utils.run_sql_command(cursor, "DROP TABLE IF EXISTS temp.player_games")
+    utils.run_sql_command(cursor, SQL_PLAYER_GAMES, dates)
+
+    stats = read_sql_frame(cursor, SQL_PLAYER_STATS).sort_values(
+        by=["playerName", "region"], ignore_index=True
+    )
+    best_games = read_sql_frame(cursor, SQL_BEST_PLAYER_GAMES).sort_values(
+        by=["date", "region", "playerName"], ignore_index=True
+    )
+    topRegions = (
+        read_sql_frame(cursor, SQL_TOP_REGIONS)
+        .sort_values(by=["region"], ignore_index=True)
+        .round({"playerAverage": 0, "averageGuessRate": 2})
     )
 
-    print(merged_df.head(5))
+    # The temporary table is the day cube, read instead of scanning the answers again
+    player_days = read_sql_frame(cursor, "SELECT * FROM temp.player_games").sort_values(
+        by=["date", "region", "playerName"], ignore_index=True
+    )
 
-    topSpamSongs = merged_df.sort_values(by=["playCount"], ascending=False).head(
-        nbDisplay
+    utils.run_sql_command(cursor, "DROP TABLE temp.player_games")
+
+    return stats, best_games, topRegions, player_days
+
+
+def get_history_last_ranked_id(path=snapshots.HISTORY_PATH):
+
+    """
+    Last rankedId contained in the per-player history, 0 before it is first written
+    """
+
+    try:
+        entry = snapshots.get_snapshot_entry("historyIndex", None, path=path)
+    except FileNotFoundError:
+        return 0
+    return entry["metadata"]["lastRankedId"]
+
+
+def update_player_history(new_answers, path=snapshots.HISTORY_PATH):
+
+    """
+    Append the answers of the ranked games played since the last run to the per-player history,
+    writing it from scratch the first time
+    """
+
+    last_ranked_id = get_history_last_ranked_id(path)
+    if not last_ranked_id:
+        answers = new_answers[utils.HISTORY_COLUMNS]
+        snapshots.write_history(answers, answers.rankedId.max(), path=path)
+        return
+
+    # new_answers may start before the history when the aggregates are behind it
+    new_answers = new_answers[new_answers.rankedId > last_ranked_id]
+    if not new_answers.empty:
+        snapshots.update_history(
+            new_answers[utils.HISTORY_COLUMNS], new_answers.rankedId.max(), path=path
+        )
+
+
+def aggregate_days_sql(cursor, sql_command, keys, start_date, end_date):
+
+    """
+    Day cube computed inside SQLite, in the same order as with pandas
+    """
+
+    return read_sql_frame(
+        cursor, sql_command, (str(start_date), str(end_date))
+    ).sort_values(by=keys, ignore_index=True)
+
+
+def process_players_top(stats):
+
+    """
+    Songs played, best score and solo points of every player
+    """
+
+    return stats.drop_duplicates("playerName")[
+        ["playerName", "totalSongs", "bestScore", "nbSoloPoints"]
+    ].rename(columns={"totalSongs": "nbSongs", "bestScore": "score"})
+
+
+# Metrics of allTop ranked in the rank index
+RANK_METRICS = ["score", "nbSongs", "nbSoloPoints"]
+
+
+def get_rank_windows(start_date, end_date, last_date):
+
+    """
+    Date windows of the rank index: the whole period, and for each month up to last_date
+    the month itself and the period from its first day
+    """
+
+    windows = [(start_date, end_date)]
+    for month_start in pd.date_range(start_date, last_date, freq="MS").date:
+        month_end = (month_start + pd.offsets.MonthEnd()).date()
+        windows.append((month_start, min(month_end, end_date)))
+        windows.append((month_start, end_date))
+
+    return list(dict.fromkeys(windows))
+
+
+def process_player_ranks(allTop):
+
+    """
+    Dense rank and tie range (min and max rank) of each player for every metric of allTop,
+    sorted by playerName
+    """
+
+    ranks = allTop[["playerName"] + RANK_METRICS].sort_values(
+        by=["playerName"], ignore_index=True
     )
-    topEasySongs = (
-        merged_df[merged_df.playCount > 1]
-        .sort_values(by=["guessRate"], ascending=False)
-        .head(nbDisplay)
+    for metric in RANK_METRICS:
+        for method in ["dense", "min", "max"]:
+            ranks[f"{metric}{method.capitalize()}Rank"] = (
+                ranks[metric].rank(method=method, ascending=False).astype("int32")
+            )
+
+    return ranks
+
+
+def process_rank_index(windows, windows_stats):
+
+    """
+    Rank index of every player for each date window, from the player stats of each window
+    """
+
+    playerRanks = pd.concat(
+        [
+            process_player_ranks(process_players_top(stats)).assign(
+                windowStart=str(start_date), windowEnd=str(end_date)
+            )
+            for (start_date, end_date), stats in zip(windows, windows_stats)
+        ],
+        ignore_index=True,
     )
-    topHardSongs = (
-        merged_df[merged_df.playCount > 2].sort_values(by=["guessRate"]).head(nbDisplay)
+
+    columns = ["windowStart", "windowEnd"] + list(playerRanks.columns[:-2])
+    return playerRanks[columns].astype(
+        {"windowStart": "category", "windowEnd": "category", "playerName": "category"}
     )
 
-    return topSpamAnime, topSpamSongs, topEasySongs, topHardSongs
 
+def read_shared_answers(answers_path, columns):
+
+    """
+    Memory-map the answers extracted by extract_shared_answers, only reading columns
+    """
+
+    table = feather.read_table(answers_path, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True)
 
-def process_players_top(topScore, topTime, topSolo):
 
-    topScore = (
-        topScore.groupby("playerName")
-        .score.first()
-        .sort_values(ascending=False)
-        .reset_index()
+def extract_shared_answers(answers_path):
+
+    """
+    Stage extracting the answers once into an uncompressed Arrow file
+    the other stages memory-map instead of getting a pickled copy
+    """
+
+    return write_shared_answers(
+        utils.extract_answers(utils.HISTORY_COLUMNS), answers_path
     )
-    topTime = topTime.groupby("playerName").nbSongs.sum().reset_index()
 
-    print(topScore.shape[0], topTime.shape[0], topSolo.shape[0])
-    allTop = (
-        topTime.merge(topScore, on="playerName", how="left")
-        .merge(topSolo, on="playerName", how="left")
-        .fillna(0)
+
+def extract_shared_new_answers(answers_path):
+
+    """
+    Stage extracting once, like extract_shared_answers, the answers of the ranked games
+    missing from the aggregates or from the history
+    """
+
+    last_ranked_id = min(
+        *get_aggregates_last_ranked_ids().values(), get_history_last_ranked_id()
     )
+    new_answers = utils.extract_new_answers(last_ranked_id)
+    print(f"{new_answers.rankedId.nunique()} new ranked games")
+    return write_shared_answers(new_answers, answers_path)
 
-    return allTop
 
+def write_shared_answers(answers, answers_path):
 
-sqliteConnection, cursor = utils.connect_to_database(
-    DATA_RAW_PATH / Path("rankedData.db")
-)
-fuse_tables(cursor)
+    table = pa.Table.from_pandas(answers, preserve_index=False)
+    del answers
+    feather.write_feather(table, answers_path, compression="uncompressed")
+    return answers_path
 
-nbDisplay = 30
-start_date = datetime.date(2022, 10, 1)
-end_date = datetime.date.today()
 
-players_answers = utils.extract_top_user_data()
+def process_player_outputs(
+    stats, best_games, topRegions, windows, windows_stats, start_date, nbDisplay
+):
 
+    """
+    Snapshots of the players leaderboards, as write_snapshot arguments
+    """
 
-topScore, topTime, topSolo = process_top_player_df(
-    players_answers, start_date, end_date, 0
-)
-allTop = process_players_top(topScore, topTime, topSolo)
-allTop.to_csv(f"data/preprocessed/allTop_{start_date}.csv")
+    topScore, topTime, topSolo = rank_top_players(best_games, stats, nbDisplay)
+    playerRanks = process_rank_index(windows, windows_stats)
+
+    return [
+        dict(df=process_players_top(stats), name="allTop", start_date=start_date),
+        dict(
+            df=playerRanks,
+            name="playerRanks",
+            start_date=start_date,
+            metadata={"windows": [[str(s), str(e)] for s, e in windows]},
+        ),
+        dict(df=topScore, name="topScore", start_date=start_date, nbDisplay=nbDisplay),
+        dict(df=topTime, name="topTime", start_date=start_date, nbDisplay=nbDisplay),
+        dict(df=topSolo, name="topSolo", start_date=start_date, nbDisplay=nbDisplay),
+        dict(df=topRegions, name="topRegions", start_date=start_date),
+    ]
 
 
-topScore, topTime, topSolo = process_top_player_df(
-    players_answers, start_date, end_date, nbDisplay
-)
-topRegions = process_top_regions(players_answers, start_date, end_date)
+def process_day_cube(day_games, name, start_date):
 
-topScore.to_csv(f"data/preprocessed/topScore_{nbDisplay}_{start_date}.csv")
-topTime.to_csv(f"data/preprocessed/topTime_{nbDisplay}_{start_date}.csv")
-topSolo.to_csv(f"data/preprocessed/topSolo_{nbDisplay}_{start_date}.csv")
-topRegions.to_csv(f"data/preprocessed/topRegions_{start_date}.csv")
-del players_answers
+    """
+    Snapshot of the per day totals, from which the pages build the leaderboards of any date range
+    """
 
-players_answers = utils.extract_top_songs_data()
-anime_songs = utils.extract_anime_songs()
+    return dict(
+        df=day_games,
+        name=name,
+        start_date=start_date,
+        metadata={"lastDate": str(day_games.date.max().date())},
+    )
 
 
-nbDisplay = 20
-topSpamAnime, topSpamSongs, topEasySongs, topHardSongs = process_top_anime_songs(
-    players_answers, anime_songs, start_date, end_date, nbDisplay
-)
-topSpamAnime.to_csv(f"data/preprocessed/topSpamAnime_{nbDisplay}_{start_date}.csv")
-topSpamSongs.to_csv(f"data/preprocessed/topSpamSongs_{nbDisplay}_{start_date}.csv")
-topEasySongs.to_csv(f"data/preprocessed/topEasySongs_{nbDisplay}_{start_date}.csv")
-topHardSongs.to_csv(f"data/preprocessed/topHardSongs_{nbDisplay}_{start_date}.csv")
+# Periods the stats over time can be downsampled to, with the pandas frequency of their bins
+OVER_TIME_PERIODS = {"day": "D", "week": "W", "month": "M"}
+
+
+def process_stats_over_time(player_days):
+
+    """
+    Player count and guess rate of each region for every day, week and month,
+    a bin being labelled by its first day with data
+    """
+
+    stats = []
+    for period, freq in OVER_TIME_PERIODS.items():
+        bins = player_days.assign(
+            date=player_days.date.dt.to_period(freq).dt.start_time.clip(
+                lower=player_days.date.min()
+            )
+        )
+        period_stats = (
+            bins.groupby(["date", "region"], observed=True)
+            .agg(
+                playerCount=("playerName", "nunique"),
+                score=("score", "sum"),
+                total=("total", "sum"),
+            )
+            .reset_index()
+        )
+        period_stats["guessRate"] = (
+            period_stats.score / period_stats.total * 100
+        ).round(2)
+        period_stats.insert(0, "period", period)
+        stats.append(period_stats.drop(columns=["score", "total"]))
+
+    return pd.concat(stats, ignore_index=True)
+
+
+def process_player_days_outputs(player_days, start_date):
+
+    """
+    Snapshots of the per day totals of the players and of the stats over time rolled up from them
+    """
+
+    return [
+        process_day_cube(player_days, "playerDays", start_date),
+        dict(
+            df=process_stats_over_time(player_days),
+            name="statsOverTime",
+            start_date=start_date,
+        ),
+    ]
+
+
+def process_song_outputs(top_songs, start_date, nbDisplay):
+
+    names = ["topSpamAnime", "topSpamSongs", "topEasySongs", "topHardSongs"]
+    return [
+        dict(df=df, name=name, start_date=start_date, nbDisplay=nbDisplay)
+        for df, name in zip(top_songs, names)
+    ]
+
+
+def process_figures(outputs):
+
+    """
+    Figures of the General Stats page as JSON, built from the snapshots as the page reads them,
+    outputs being the write_snapshot arguments of the players and songs stages by name
+    """
+
+    def load(name):
+        output = outputs[name]
+        return snapshots.load_snapshot(
+            name, output["start_date"], output.get("nbDisplay")
+        )
+
+    return figures.to_json(
+        {
+            "players": figures.top_players_figures(
+                load("topScore"), load("topTime"), load("topSolo")
+            ),
+            "regions": figures.top_regions_figures(load("topRegions")),
+            "songs": figures.top_anime_songs_figures(
+                *[load(name) for name in figures.SONG_TABLES]
+            ),
+        }
+    )
+
+
+def players_stage(player_games, start_date, end_date, nbDisplay):
+
+    """
+    Stage computing the players leaderboards from the per game aggregates
+    """
+
+    player_games = filter_dates(player_games, start_date, end_date)
+    stats = aggregate_player_stats(player_games)
+
+    # The whole period is the first window, its stats are already there
+    windows = get_rank_windows(start_date, end_date, player_games.date.max())
+    windows_stats = [stats] + [
+        aggregate_player_stats(filter_dates(player_games, *window))
+        for window in windows[1:]
+    ]
+
+    return process_player_outputs(
+        stats,
+        best_player_games(player_games),
+        process_top_regions_games(player_games, start_date, end_date),
+        windows,
+        windows_stats,
+        start_date,
+        nbDisplay,
+    ) + process_player_days_outputs(player_games, start_date)
+
+
+def players_answers_stage(answers_path, start_date, end_date, nbDisplay):
+
+    players_answers = read_shared_answers(
+        answers_path, ["date", "region", "playerName", "isCorrect", "correctCount"]
+    )
+    player_games = aggregate_player_games(
+        filter_dates(players_answers, start_date, end_date)
+    )
+    del players_answers
+
+    return players_stage(player_games, start_date, end_date, nbDisplay)
+
+
+def players_sql_stage(start_date, end_date, nbDisplay):
+
+    sqliteConnection, cursor = utils.connect_to_database(
+        DATA_RAW_PATH / Path("rankedData.db")
+    )
+
+    stats, best_games, topRegions, player_days = aggregate_players_sql(
+        cursor, start_date, end_date
+    )
+    sqliteConnection.close()
+
+    # The other windows are rolled up from the day cube instead of scanning the answers again
+    windows = get_rank_windows(start_date, end_date, player_days.date.max())
+    windows_stats = [stats] + [
+        aggregate_player_stats(filter_dates(player_days, *window))
+        for window in windows[1:]
+    ]
+
+    return process_player_outputs(
+        stats, best_games, topRegions, windows, windows_stats, start_date, nbDisplay
+    ) + process_player_days_outputs(player_days, start_date)
+
+
+def songs_answers_stage(answers_path, start_date, end_date, nbDisplay):
+
+    players_answers = read_shared_answers(
+        answers_path, ["rankedId", "date", "region", "songId", "isCorrect"]
+    )
+    song_games = aggregate_song_games(
+        filter_dates(players_answers, start_date, end_date)
+    )
+    del players_answers
+
+    top_songs = process_top_song_games(
+        song_games, utils.extract_anime_songs(), start_date, end_date, nbDisplay
+    )
+    return process_song_outputs(top_songs, start_date, nbDisplay) + [
+        process_day_cube(song_games, "songDays", start_date)
+    ]
+
+
+def songs_games_stage(song_games, start_date, end_date, nbDisplay):
+
+    top_songs = process_top_song_games(
+        song_games, utils.extract_anime_songs(), start_date, end_date, nbDisplay
+    )
+    song_games = filter_dates(song_games, start_date, end_date)
+    return process_song_outputs(top_songs, start_date, nbDisplay) + [
+        process_day_cube(song_games, "songDays", start_date)
+    ]
+
+
+def songs_sql_stage(start_date, end_date, nbDisplay):
+
+    with utils.database_cursor() as cursor:
+        song_days = aggregate_days_sql(
+            cursor, SQL_SONG_DAYS, ["date", "region", "songId"], start_date, end_date
+        )
+    # A ranked game has a single date and region, so its plays are not counted twice
+    top_songs = process_top_song_games(
+        song_days, utils.extract_anime_songs(), start_date, end_date, nbDisplay
+    )
+    return process_song_outputs(top_songs, start_date, nbDisplay) + [
+        process_day_cube(song_days, "songDays", start_date)
+    ]
+
+
+def history_answers_stage(answers_path):
+
+    answers = read_shared_answers(answers_path, utils.HISTORY_COLUMNS)
+    snapshots.write_history(answers, answers.rankedId.max())
+    return []
+
+
+def history_sql_stage():
+
+    answers = utils.extract_answers(utils.HISTORY_COLUMNS)
+    snapshots.write_history(answers, answers.rankedId.max())
+    return []
+
+
+def aggregates_incremental_stage(answers_path):
+
+    return update_aggregates(read_shared_answers(answers_path, utils.HISTORY_COLUMNS))
+
+
+def history_incremental_stage(answers_path):
+
+    update_player_history(read_shared_answers(answers_path, utils.HISTORY_COLUMNS))
+    return []
+
+
+def build_stages(incremental, backend, answers_path):
+
+    """
+    Stages of the preprocessing as {name: (function, dependencies)},
+    each function getting the results of its dependencies as arguments
+    """
+
+    start_date = datetime.date(2022, 10, 1)
+    end_date = datetime.date.today()
+    players = dict(start_date=start_date, end_date=end_date, nbDisplay=30)
+    songs = dict(start_date=start_date, end_date=end_date, nbDisplay=20)
+
+    if backend == "sql":
+        return {
+            "players": (partial(players_sql_stage, **players), []),
+            "songs": (partial(songs_sql_stage, **songs), []),
+            "history": (history_sql_stage, []),
+        }
+
+    if incremental:
+        return {
+            "newAnswers": (partial(extract_shared_new_answers, answers_path), []),
+            "aggregates": (aggregates_incremental_stage, ["newAnswers"]),
+            "players": (
+                partial(aggregates_stage, players_stage, 0, **players),
+                ["aggregates"],
+            ),
+            "songs": (
+                partial(aggregates_stage, songs_games_stage, 1, **songs),
+                ["aggregates"],
+            ),
+            "history": (history_incremental_stage, ["newAnswers"]),
+        }
+
+    return {
+        "answers": (partial(extract_shared_answers, answers_path), []),
+        "players": (partial(players_answers_stage, **players), ["answers"]),
+        "songs": (partial(songs_answers_stage, **songs), ["answers"]),
+        "history": (history_answers_stage, ["answers"]),
+    }
+
+
+def aggregates_stage(stage, position, aggregates, **kwargs):
+
+    """
+    Run stage on one of the aggregates returned by update_aggregates
+    """
+
+    return stage(aggregates[position], **kwargs)
+
+
+def timed_stage(function, arguments):
+
+    start = time.perf_counter()
+    result = function(*arguments)
+    return result, time.perf_counter() - start
+
+
+def run_stages(stages, workers=1):
+
+    """
+    Run every stage once its dependencies are done, on a pool of workers processes
+    (in this process with a single worker). Return the result and wall time of each stage
+    """
+
+    results, timings = {}, {}
+    pending = dict(stages)
+
+    if workers <= 1:
+        while pending:
+            ready = [
+                name
+                for name, (_, dependencies) in pending.items()
+                if all(dependency in results for dependency in dependencies)
+            ]
+            if not ready:
+                raise ValueError(f"Stages {list(pending)} can not be run")
+            for name in ready:
+                function, dependencies = pending.pop(name)
+                results[name], timings[name] = timed_stage(
+                    function, [results[dependency] for dependency in dependencies]
+                )
+        return results, timings
+
+    # spawn so the workers do not inherit the SQLite connections of this process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(min(workers, len(stages)), mp_context=context) as executor:
+        running = {}
+        while pending or running:
+            for name, (function, dependencies) in list(pending.items()):
+                if all(dependency in results for dependency in dependencies):
+                    arguments = [results[dependency] for dependency in dependencies]
+                    running[executor.submit(timed_stage, function, arguments)] = name
+                    del pending[name]
+            if not running:
+                raise ValueError(f"Stages {list(pending)} can not be run")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                results[name], timings[name] = future.result()
+
+    return results, timings
+
+
+def main(materialize=False, incremental=False, backend="pandas", workers=1):
+
+    sqliteConnection, cursor = utils.connect_to_database(
+        DATA_RAW_PATH / Path("rankedData.db")
+    )
+    fuse_tables(cursor, materialize=materialize)
+    sqliteConnection.close()
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(dir=DATA_RAW_PATH) as tmp_path:
+        stages = build_stages(incremental, backend, Path(tmp_path) / "answers.arrow")
+        results, timings = run_stages(stages, workers)
+
+    # Only this process writes to the manifest
+    outputs = {}
+    for name in stages:
+        if name in ["players", "songs"]:
+            for snapshot in results[name]:
+                snapshots.write_snapshot(**snapshot)
+                outputs[snapshot["name"]] = snapshot
+
+    snapshots.write_json_snapshot(
+        process_figures(outputs), "figures", outputs["topScore"]["start_date"]
+    )
+
+    print("\nStage wall times:")
+    for name, seconds in timings.items():
+        print(f"  {name:<12}{seconds:8.2f}s")
+    print(f"  {'total':<12}{time.perf_counter() - start:8.2f}s")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Preprocess the ranked data")
+    parser.add_argument(
+        "--materialize",
+        action="store_true",
+        help="store players_answers as an indexed table refreshed with the new ranked games",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help=f"only fold the new ranked games into the aggregates kept in {AGGREGATES_PATH}",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="pandas",
+        help="where the leaderboards are aggregated: in pandas from the extracted answers, or inside SQLite",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="number of processes running the independent stages, 1 to run them in this process",
+    )
+    args = parser.parse_args()
+    if args.incremental and args.backend == "sql":
+        parser.error("--incremental only applies to the pandas backend")
+
+    main(
+        materialize=args.materialize,
+        incremental=args.incremental,
+        backend=args.backend,
+        workers=args.workers,
+    )
@@ -0,0 +1,449 @@
+"""
+Columnar store for the preprocessed data.
+
+Each snapshot is an uncompressed Arrow IPC file so the pages can memory-map it
+and only read the columns they need. A manifest keeps track of the current
+version of every snapshot, keyed by name, nbDisplay and start date.
+"""
+
+import os
+import re
+import json
+import zlib
+import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+PREPROCESSED_DATA_PATH = Path("data/preprocessed")
+MANIFEST_NAME = "manifest.json"
+
+
+def snapshot_key(name, start_date, nbDisplay=None):
+
+    """
+    Same naming as the old CSV outputs: topScore_30_2022-10-01, allTop_2022-10-01...
+    Snapshots that do not depend on a start date are only keyed by their name
+    """
+
+    if start_date is None:
+        return name
+    if nbDisplay:
+        return f"{name}_{nbDisplay}_{start_date}"
+    return f"{name}_{start_date}"
+
+
+def snapshot_file_name(key, version):
+
+    return f"{key}.v{version}.arrow"
+
+
+def read_manifest(path=PREPROCESSED_DATA_PATH):
+
+    manifest_path = Path(path) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {"snapshots": {}}
+    with open(manifest_path, encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+
+def write_manifest(manifest, path=PREPROCESSED_DATA_PATH):
+
+    """
+    Replace the manifest atomically so readers never see a half written one
+    """
+
+    manifest_path = Path(path) / MANIFEST_NAME
+    tmp_path = manifest_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def manifest_version(path=PREPROCESSED_DATA_PATH):
+
+    """
+    Changes every time a snapshot is written, to key what the pages derive from the snapshots
+    """
+
+    manifest_path = Path(path) / MANIFEST_NAME
+    return manifest_path.stat().st_mtime_ns if manifest_path.exists() else None
+
+
+def write_snapshot(
+    df,
+    name,
+    start_date,
+    nbDisplay=None,
+    path=PREPROCESSED_DATA_PATH,
+    metadata=None,
+    keep_previous=False,
+):
+
+    """
+    Write df as the next version of the snapshot and point the manifest to it,
+    metadata being stored along in the manifest entry.
+    The previous version is removed unless keep_previous is True
+    """
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    key = snapshot_key(name, start_date, nbDisplay)
+    manifest = read_manifest(path)
+    previous = manifest["snapshots"].get(key)
+    version = previous["version"] + 1 if previous else 1
+
+    # Categoricals coming from the answers keep every player in their categories
+    df = df.apply(
+        lambda column: column.cat.remove_unused_categories()
+        if isinstance(column.dtype, pd.CategoricalDtype)
+        else column
+    )
+
+    file_name = snapshot_file_name(key, version)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    feather.write_feather(table, path / file_name, compression="uncompressed")
+
+    entry = {
+        "name": name,
+        "startDate": None if start_date is None else str(start_date),
+        "nbDisplay": nbDisplay,
+        "version": version,
+        "file": file_name,
+        "rows": table.num_rows,
+        "columns": table.column_names,
+        "metadata": metadata or {},
+    }
+    return publish_snapshot(manifest, key, entry, path, keep_previous)
+
+
+def publish_snapshot(manifest, key, entry, path, keep_previous=False):
+
+    """
+    Point the manifest to the new version of a snapshot and remove the previous one,
+    unless keep_previous is True
+    """
+
+    previous = manifest["snapshots"].get(key)
+    manifest["snapshots"][key] = {
+        **entry,
+        "createdAt": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    write_manifest(manifest, path)
+
+    # Pages that already mapped the previous version keep reading it until they reload
+    if previous and previous["file"] != entry["file"] and not keep_previous:
+        (path / previous["file"]).unlink(missing_ok=True)
+
+    return manifest["snapshots"][key]
+
+
+def write_json_snapshot(text, name, start_date, path=PREPROCESSED_DATA_PATH):
+
+    """
+    Write a JSON document, already serialized as text, as the next version of the snapshot
+    """
+
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    key = snapshot_key(name, start_date)
+    manifest = read_manifest(path)
+    previous = manifest["snapshots"].get(key)
+    version = previous["version"] + 1 if previous else 1
+
+    file_name = f"{key}.v{version}.json"
+    (path / file_name).write_text(text, encoding="utf-8")
+
+    entry = {
+        "name": name,
+        "startDate": None if start_date is None else str(start_date),
+        "nbDisplay": None,
+        "version": version,
+        "file": file_name,
+        "metadata": {},
+    }
+    return publish_snapshot(manifest, key, entry, path)
+
+
+def load_json_snapshot(name, start_date, path=PREPROCESSED_DATA_PATH):
+
+    path = Path(path)
+    entry = get_snapshot_entry(name, start_date, path=path)
+    with open(path / entry["file"], encoding="utf-8") as json_file:
+        return json.load(json_file)
+
+
+def get_snapshot_entry(name, start_date, nbDisplay=None, path=PREPROCESSED_DATA_PATH):
+
+    """
+    Manifest entry of the current version of the snapshot
+    """
+
+    key = snapshot_key(name, start_date, nbDisplay)
+    entry = read_manifest(path)["snapshots"].get(key)
+    if entry is None:
+        raise FileNotFoundError(f"No snapshot {key} in {Path(path) / MANIFEST_NAME}")
+    return entry
+
+
+def load_snapshot(
+    name,
+    start_date,
+    nbDisplay=None,
+    columns=None,
+    path=PREPROCESSED_DATA_PATH,
+    rows=None,
+):
+
+    """
+    Memory-map the current version of the snapshot and only read the requested columns,
+    and the rows (offset, length) if given
+    """
+
+    path = Path(path)
+
+    # The version read from the manifest may be replaced before its file is opened,
+    # the manifest then points to the new one
+    for attempt in range(2):
+        entry = get_snapshot_entry(name, start_date, nbDisplay, path)
+        try:
+            return read_snapshot_file(path / entry["file"], columns, rows)
+        except FileNotFoundError:
+            if attempt:
+                raise
+
+
+def read_snapshot_file(file_path, columns=None, rows=None):
+
+    table = feather.read_table(file_path, columns=columns, memory_map=True)
+    if rows is not None:
+        table = table.slice(*rows)
+    return table.to_pandas(split_blocks=True)
+
+
+# Per-player history: the answers are split in shards by player, each shard being
+# sorted by player so the answers of one player are a contiguous block of rows.
+# The index points to a version of each shard, the versions of the previous index
+# being kept so the pages still holding it can read them
+HISTORY_PATH = PREPROCESSED_DATA_PATH / "history"
+HISTORY_NB_SHARDS = 64
+HISTORY_SHARD_FILE = re.compile(r"history\d+\.v\d+\.arrow")
+
+# Index of the history of each path, with the version of the snapshot it was read from
+_history_indexes = {}
+
+
+def history_shards(players):
+
+    """
+    Shard of each player, the same from one run to the next
+    """
+
+    return np.array(
+        [zlib.crc32(player.encode("utf-8")) % HISTORY_NB_SHARDS for player in players],
+        dtype=np.int32,
+    )
+
+
+def sort_history(answers):
+
+    """
+    Sort the answers by shard then player, the answers of a player keeping their order.
+    Return them with the shard of each row, the answers without a player being dropped
+    """
+
+    if not isinstance(answers.playerName.dtype, pd.CategoricalDtype):
+        answers = answers.astype({"playerName": "category"})
+    if answers.playerName.hasnans:
+        answers = answers[answers.playerName.notna()]
+
+    # The categories are sorted, so sorting the codes sorts the players
+    codes = answers.playerName.cat.codes.to_numpy()
+    shards = history_shards(answers.playerName.cat.categories)[codes]
+
+    order = np.lexsort((codes, shards))
+    return answers.iloc[order].reset_index(drop=True), shards[order]
+
+
+def read_history_index(path=HISTORY_PATH):
+
+    """
+    Shard, shard version, offset and length of the history of each player
+    """
+
+    return load_snapshot("historyIndex", None, path=path)
+
+
+def history_files(index):
+
+    return {
+        snapshot_file_name(f"history{shard}", version)
+        for shard, version in set(zip(index["shard"], index["version"]))
+    }
+
+
+def write_history(answers, last_ranked_id, shards=None, path=HISTORY_PATH):
+
+    """
+    Write the answers of the shards (all of them by default) and update the index
+    giving the shard, shard version, offset and length of the history of each player.
+    The shards of the previous index are kept, older ones are removed
+    """
+
+    path = Path(path)
+    try:
+        previous_index = read_history_index(path)
+    except FileNotFoundError:
+        previous_index = None
+
+    answers, answer_shards = sort_history(answers)
+    bounds = np.searchsorted(answer_shards, np.arange(HISTORY_NB_SHARDS + 1))
+    shards = range(HISTORY_NB_SHARDS) if shards is None else shards
+
+    indexes = []
+    for shard in shards:
+        shard_answers = answers.iloc[bounds[shard] : bounds[shard + 1]]
+        entry = write_snapshot(
+            shard_answers, f"history{shard}", None, path=path, keep_previous=True
+        )
+
+        lengths = shard_answers.groupby("playerName", observed=True).size()
+        indexes.append(
+            pd.DataFrame(
+                {
+                    "playerName": lengths.index.astype(str),
+                    "shard": shard,
+                    "version": entry["version"],
+                    "offset": lengths.cumsum().to_numpy() - lengths.to_numpy(),
+                    "length": lengths.to_numpy(),
+                }
+            )
+        )
+
+    if len(shards) < HISTORY_NB_SHARDS:
+        indexes.append(previous_index[~previous_index["shard"].isin(shards)])
+
+    index = pd.concat(indexes, ignore_index=True).sort_values(
+        by=["playerName"], ignore_index=True
+    )
+    write_snapshot(
+        index,
+        "historyIndex",
+        None,
+        path=path,
+        metadata={"lastRankedId": int(last_ranked_id)},
+    )
+
+    # Only removed once the new index is published
+    keep = history_files(index)
+    if previous_index is not None:
+        keep |= history_files(previous_index)
+    for file_path in path.iterdir():
+        if HISTORY_SHARD_FILE.fullmatch(file_path.name) and file_path.name not in keep:
+            file_path.unlink(missing_ok=True)
+
+
+def update_history(new_answers, last_ranked_id, path=HISTORY_PATH):
+
+    """
+    Append new answers to the history, only rewriting the shards of their players
+    """
+
+    shards = np.unique(history_shards(new_answers.playerName.dropna().unique()))
+    previous = [load_snapshot(f"history{shard}", None, path=path) for shard in shards]
+    answers = pd.concat(
+        [answers.astype({"playerName": str}) for answers in previous]
+        + [new_answers[previous[0].columns].astype({"playerName": str})],
+        ignore_index=True,
+    )
+
+    # Shards only keep the categories they use, so the concatenation lost them
+    for column in previous[0].select_dtypes("category").columns:
+        answers[column] = answers[column].astype("category")
+
+    write_history(answers, last_ranked_id, list(shards), path)
+
+
+def get_history_index(path=HISTORY_PATH):
+
+    """
+    Shard, shard version, offset and length of the history of each player,
+    kept in memory until a new version of the index is written
+    """
+
+    entry = get_snapshot_entry("historyIndex", None, path=path)
+    key = Path(path).resolve()
+    cached = _history_indexes.get(key)
+    if cached is None or cached[0] != entry["version"]:
+        index = read_history_index(path)
+        cached = (
+            entry["version"],
+            dict(
+                zip(
+                    index.playerName,
+                    zip(index["shard"], index["version"], index.offset, index.length),
+                )
+            ),
+        )
+        _history_indexes[key] = cached
+    return cached[1]
+
+
+def load_history(
+    player, start_date=None, end_date=None, columns=None, path=HISTORY_PATH
+):
+
+    """
+    Answers of player between start_date and end_date (included) read from its block
+    of the version of the shard the index points to, None if the history does not know the player
+    """
+
+    path = Path(path)
+    read_columns = None
+    if columns is not None:
+        read_columns = list(dict.fromkeys(["playerName", *columns]))
+
+    for attempt in range(2):
+        try:
+            location = get_history_index(path).get(player)
+        except FileNotFoundError:
+            return None
+        if location is None:
+            return None
+
+        shard, version, offset, length = location
+        try:
+            answers = read_snapshot_file(
+                path / snapshot_file_name(f"history{shard}", version),
+                read_columns,
+                rows=(offset, length),
+            )
+            break
+        except FileNotFoundError:
+            # Removed since the index was read, the new index points to a newer version
+            if attempt:
+                raise
+
+    # The block has to be the player's, whatever index and shard were read
+    if len(answers) and not (
+        answers.playerName.iloc[0] == player == answers.playerName.iloc[-1]
+    ):
+        raise ValueError(
+            f"History of {player} in history{shard} v{version} does not match its index"
+        )
+    if columns is not None:
+        answers = answers[list(columns)]
+
+    if start_date is not None:
+        answers = answers[answers.date >= str(start_date)]
+    if end_date is not None:
+        answers = answers[answers.date <= str(end_date)]
+    answers = answers.reset_index(drop=True)
+
+    if "region" in answers.columns:
+        answers["region"] = answers.region.cat.remove_unused_categories()
+    return answers
@@ -0,0 +1,47 @@
+import sys
+import sqlite3
+from pathlib import Path
+import pytest
+
+# The modules of the app are imported from the root of the repository
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import utils
+import preprocess_data
+import generate_ranked_data
+
+
+def make_ranked_database(path, nb_answers, nb_days, statements=()):
+
+    """
+    Synthetic rankedData.db with the views of the app, statements being run on its tables first
+    """
+
+    generate_ranked_data.generate(path, nb_answers, nb_days)
+
+    sqliteConnection = sqlite3.connect(path)
+    for statement in statements:
+        sqliteConnection.execute(statement)
+    sqliteConnection.commit()
+    sqliteConnection.close()
+
+    sqliteConnection, cursor = utils.connect_to_database(path)
+    preprocess_data.fuse_tables(cursor)
+    sqliteConnection.close()
+
+
+@pytest.fixture
+def ranked_database(tmp_path, monkeypatch):
+
+    """
+    Build a database in a temporary data/ tree the app reads from, with make_ranked_database arguments
+    """
+
+    monkeypatch.chdir(tmp_path)
+
+    def build(nb_answers=20_000, nb_days=6, statements=()):
+        make_ranked_database(utils.DATABASE_PATH, nb_answers, nb_days, statements)
+        return utils.DATABASE_PATH
+
+    yield build
+    utils.close_connection_pools()
@@ -0,0 +1,35 @@
+import datetime
+import pandas as pd
+import utils
+import preprocess_data
+import generate_ranked_data
+
+START_DATE = generate_ranked_data.START_DATE
+END_DATE = START_DATE + datetime.timedelta(days=30)
+
+KEYS = ["date", "region", "playerName"]
+
+
+def test_player_days_with_null_answers(ranked_database):
+
+    ranked_database(
+        statements=["UPDATE player_answers SET if_correct = NULL WHERE id % 97 = 0"]
+    )
+
+    answers = utils.extract_top_user_data()
+    assert answers.isCorrect.isna().any()
+    player_days = preprocess_data.aggregate_player_games(answers)
+
+    sqliteConnection, cursor = utils.connect_to_database(utils.DATABASE_PATH)
+    sql_player_days = preprocess_data.aggregate_days_sql(
+        cursor, preprocess_data.SQL_PLAYER_DAYS, KEYS, START_DATE, END_DATE
+    )
+    sqliteConnection.close()
+
+    # NULL answers are neither scored nor counted by both backends
+    pd.testing.assert_frame_equal(
+        player_days.sort_values(by=KEYS, ignore_index=True),
+        sql_player_days,
+        check_dtype=False,
+        check_categorical=False,
+    )
@@ -0,0 +1,55 @@
+import sqlite3
+import pandas as pd
+import utils
+
+COLUMNS = ["rankedId", "date", "region", "playerName", "songId", "isCorrect"]
+
+
+def read_answers(database_path, columns):
+
+    sqliteConnection = sqlite3.connect(database_path)
+    df = pd.read_sql(
+        f"SELECT {', '.join(columns)} FROM players_answers WHERE rankedId IS NOT NULL",
+        sqliteConnection,
+    )
+    sqliteConnection.close()
+    return df
+
+
+def test_extract_answers_with_nulls(ranked_database):
+
+    database_path = ranked_database(
+        statements=[
+            "UPDATE ranked_songs SET song_id = NULL WHERE id = 2",
+            "UPDATE player_answers SET if_correct = NULL WHERE id IN (1, 5)",
+        ]
+    )
+
+    answers = utils.extract_answers(COLUMNS)
+    expected = read_answers(database_path, COLUMNS)
+
+    assert len(answers) == len(expected)
+    assert answers.songId.dtype == "Int32"
+    assert answers.isCorrect.dtype == "boolean"
+    assert answers.songId.isna().sum() == expected.songId.isna().sum() > 0
+    assert answers.isCorrect.isna().sum() == 2
+    assert answers.songId.sum() == expected.songId.sum()
+    assert answers.isCorrect.sum() == expected.isCorrect.sum()
+
+    # Columns without NULLs keep their compact dtype
+    assert answers.rankedId.dtype == "int32"
+    assert (answers.playerName.astype(str) == expected.playerName).all()
+
+
+def test_extract_answers_without_rows(ranked_database):
+
+    ranked_database()
+
+    answers = utils.extract_answers(COLUMNS, "rankedId > ?", (10**9,))
+
+    assert answers.empty
+    assert list(answers.columns) == COLUMNS
+    assert answers.date.dtype == "datetime64[ns]"
+    assert isinstance(answers.region.dtype, pd.CategoricalDtype)
+    assert isinstance(answers.playerName.dtype, pd.CategoricalDtype)
+    assert answers.isCorrect.dtype == "bool"
@@ -0,0 +1,38 @@
+import numpy as np
+import utils
+
+
+def test_spill_files_are_removed(tmp_path):
+
+    stale = tmp_path / f"{utils.RESULT_CACHE_SPILL_PREFIX}stale.pkl"
+    stale.write_bytes(b"")
+    (tmp_path / "other.pkl").write_bytes(b"")
+    cache = utils.ResultCache(
+        max_bytes=3_000_000, spill_path=tmp_path, spill_max_bytes=5_000_000
+    )
+    # Files of a previous process are not tracked by the cache, other files are left alone
+    assert not stale.exists()
+    assert (tmp_path / "other.pkl").exists()
+
+    for i in range(10):
+        cache.put(("result", i), np.zeros(125_000))
+
+    # Only the last spilled results are kept within the disk budget
+    stats = cache.stats()
+    assert stats["spillEvictions"] > 0
+    assert stats["spilledBytes"] <= cache.spill_max_bytes
+    assert (
+        len(list(tmp_path.glob(f"{utils.RESULT_CACHE_SPILL_PREFIX}*.pkl")))
+        == stats["spilledEntries"]
+    )
+    assert cache.get(("result", 0)) is None
+
+    # A spilled result loaded back or replaced no longer has a spill file
+    assert cache.get(("result", 6)) is not None
+    assert not cache._spill_file(("result", 6)).exists()
+    cache.put(("result", 5), np.ones(10))
+    assert not cache._spill_file(("result", 5)).exists()
+
+    cache.clear()
+    assert not list(tmp_path.glob(f"{utils.RESULT_CACHE_SPILL_PREFIX}*.pkl"))
+    assert cache.stats()["spilledBytes"] == 0
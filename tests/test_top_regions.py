@@ -0,0 +1,94 @@
+import datetime
+import pandas as pd
+import pytest
+import utils
+import preprocess_data
+import generate_ranked_data
+
+START_DATE = generate_ranked_data.START_DATE
+
+
+# process_top_regions before it was vectorized, kept as the reference of the test
+def count_unique_players(x):
+    return len(x.playerName.unique())
+
+
+def mean_correct_guess_rate(x):
+
+    eligible = (
+        x.groupby("playerName", observed=True)
+        .isCorrect.count()
+        .reset_index(name="songCount")
+    )
+    eligible = eligible[eligible.songCount >= 850]
+
+    pGuessRate = (
+        x.groupby("playerName", observed=True)
+        .isCorrect.mean()
+        .reset_index(name="guessRate")
+    )
+    pGuessRate = pGuessRate[pGuessRate.playerName.isin(eligible.playerName)].assign(
+        guessRate=lambda x: x.guessRate * 100
+    )
+
+    return (
+        pGuessRate.sort_values(by=["guessRate"], ascending=False)
+        .head(150)
+        .guessRate.mean()
+        .round(2)
+    )
+
+
+def previous_process_top_regions(players_answers, start_date, end_date):
+
+    players_answers = players_answers[players_answers.date >= str(start_date)]
+    players_answers = players_answers[players_answers.date <= str(end_date)]
+
+    top_regions = (
+        players_answers.groupby("region", observed=True)
+        .apply(count_unique_players)
+        .rename("playerCount")
+        .reset_index()
+    )
+
+    average_players = (
+        players_answers.groupby(["date", "region"], observed=True)
+        .apply(count_unique_players)
+        .rename("playerCount")
+        .reset_index()
+    )
+
+    mean_player_count = (
+        average_players.groupby("region", observed=True)
+        .playerCount.mean()
+        .round()
+        .reset_index(name="playerAverage")
+    )
+
+    mean_guess_rates = (
+        players_answers.groupby("region", observed=True)
+        .apply(mean_correct_guess_rate)
+        .reset_index(name="averageGuessRate")
+    )
+
+    return pd.merge(top_regions, mean_player_count, on="region").merge(
+        mean_guess_rates, on="region"
+    )
+
+
+@pytest.mark.parametrize("nb_days", [30, 25])
+def test_process_top_regions(ranked_database, nb_days):
+
+    # Enough days for players of every region to reach the 850 songs of the guess rate
+    ranked_database(nb_answers=100_000, nb_days=30)
+    answers = utils.extract_top_user_data()
+    end_date = START_DATE + datetime.timedelta(days=nb_days - 1)
+
+    expected = previous_process_top_regions(answers, START_DATE, end_date)
+    assert expected.averageGuessRate.notna().all()
+
+    pd.testing.assert_frame_equal(
+        preprocess_data.process_top_regions(answers, START_DATE, end_date),
+        expected,
+        check_dtype=False,
+    )
@@ -0,0 +1,99 @@
+import datetime
+import importlib.util
+from pathlib import Path
+import pandas as pd
+import pytest
+import streamlit as st
+import utils
+import snapshots
+import preprocess_data
+import generate_ranked_data
+
+START_DATE = generate_ranked_data.START_DATE
+PAGE_PATH = (
+    Path(__file__).resolve().parents[1] / "pages" / "3_Ranked_🤖_Specific_User_Stats.py"
+)
+
+# A range matching no window of the rank index, and the month window it falls in
+CUSTOM_RANGE = (datetime.date(2022, 10, 1), datetime.date(2022, 10, 20))
+MONTH_WINDOW = (datetime.date(2022, 10, 1), datetime.date(2022, 10, 31))
+
+
+def reference_ranks(answers, start_date, end_date):
+
+    player_games = preprocess_data.aggregate_player_games(
+        preprocess_data.filter_dates(answers, start_date, end_date)
+    )
+    return preprocess_data.process_player_ranks(
+        preprocess_data.process_players_top(
+            preprocess_data.aggregate_player_stats(player_games)
+        )
+    ).set_index("playerName")
+
+
+@pytest.fixture
+def user_page(ranked_database):
+
+    """
+    Specific User page run on a preprocessed database, the page being imported once
+    the data is there as it runs at import
+    """
+
+    ranked_database(nb_answers=40_000, nb_days=45)
+    preprocess_data.main(workers=1)
+
+    st.cache_resource.clear()
+    utils.get_result_cache().clear()
+    spec = importlib.util.spec_from_file_location("user_page", PAGE_PATH)
+    page = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(page)
+    yield page
+    st.cache_resource.clear()
+    utils.get_result_cache().clear()
+
+
+def assert_user_ranks(page, answers, start_date, end_date):
+
+    expected = reference_ranks(answers, start_date, end_date)
+    for username in expected.index[::25]:
+        pd.testing.assert_series_equal(
+            page.get_user_ranks(username, start_date, end_date),
+            expected.loc[username],
+            check_dtype=False,
+            check_names=False,
+        )
+
+
+def test_custom_range_ranks(user_page):
+
+    windows = snapshots.get_snapshot_entry("playerRanks", START_DATE)["metadata"][
+        "windows"
+    ]
+    last_date = snapshots.get_snapshot_entry("playerDays", START_DATE)["metadata"][
+        "lastDate"
+    ]
+    assert user_page.get_rank_window(windows, *CUSTOM_RANGE, last_date) is None
+
+    # Rolled up from the player day cube, and read from the rank index for a window
+    answers = utils.extract_top_user_data()
+    assert_user_ranks(user_page, answers, *CUSTOM_RANGE)
+    assert_user_ranks(user_page, answers, *MONTH_WINDOW)
+
+
+def test_ranks_without_player_day_cube(user_page):
+
+    # Preprocessings older than the cube only wrote the rank index
+    manifest = snapshots.read_manifest()
+    del manifest["snapshots"][snapshots.snapshot_key("playerDays", START_DATE)]
+    snapshots.write_manifest(manifest)
+
+    answers = utils.extract_top_user_data()
+    assert_user_ranks(user_page, answers, *MONTH_WINDOW)
+
+    # Other ranges get the ranks of the shortest window covering them
+    username = reference_ranks(answers, *MONTH_WINDOW).index[0]
+    pd.testing.assert_series_equal(
+        user_page.get_user_ranks(username, *CUSTOM_RANGE),
+        user_page.get_user_ranks(username, *MONTH_WINDOW),
+        check_names=False,
+    )
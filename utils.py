@@ -1,16 +1,278 @@
+import sys
 import sqlite3
+import threading
+import time
+import atexit
+import hashlib
+import pickle
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
 import pandas as pd
-import streamlit as st
+import instrumentation
 
+DATABASE_PATH = Path("data/raw/rankedData.db")
 
-def connect_to_database(database_path):
+# Negative cache_size is in KiB, so 32MB of page cache per connection
+SQLITE_CACHE_SIZE = -32000
+SQLITE_MMAP_SIZE = 1024**3
+
+# Categories are kept sorted so groupbys and sorts give the same order as with strings
+REGION_DTYPE = pd.CategoricalDtype(["America", "Asia", "Europe"])
+
+# Code in REGION_DTYPE of the regions 1 (Asia), 2 (Europe) and 3 (America) of the database
+REGION_CODES = np.array([-1, 1, 2, 0], dtype=np.int8)
+
+# Compact dtypes of the answers DataFrames.
+# Group by the categorical columns with observed=True to only get the combinations present.
+# Integer and bool columns holding NULLs get their nullable dtype of NULLABLE_DTYPES instead
+ANSWERS_SCHEMA = {
+    "rankedId": "int32",
+    "date": "datetime64[ns]",
+    "region": REGION_DTYPE,
+    "rankedSongId": "int32",
+    "rankedSongNumber": "int16",
+    "songId": "int32",
+    "startTime": "float32",
+    "correctCount": "int16",
+    "activePlayers": "int16",
+    "playerId": "int32",
+    "playerName": "category",
+    # NULL when the player did not answer
+    "animeId": "float32",
+    "guessTime": "float32",
+    "isCorrect": "bool",
+}
+ANSWERS_COLUMNS = list(ANSWERS_SCHEMA)
+
+NULLABLE_DTYPES = {"int32": "Int32", "int16": "Int16", "bool": "boolean"}
+
+# Columns dictionary encoded while streaming players_answers
+ENCODED_COLUMNS = ["date", "playerName"]
+
+# Columns of the per-player history written by the preprocessing for the user page
+HISTORY_COLUMNS = [
+    "playerName",
+    "rankedId",
+    "date",
+    "region",
+    "rankedSongId",
+    "songId",
+    "correctCount",
+    "isCorrect",
+]
+
+# Number of rows fetched at once when streaming players_answers
+ANSWERS_CHUNKSIZE = 100_000
+
+
+class PooledConnection(sqlite3.Connection):
+
+    """
+    SQLite connection handed out by a ConnectionPool, closing it gives it back to the pool
+    """
+
+    pool = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+
+class ConnectionPool:
+
+    """
+    Thread-safe pool of connections to one SQLite database, shared by every Streamlit session of the process.
+    Read-only pools open the database with a mode=ro URI, the read-write one sets it to WAL so both can be used at once.
+    """
+
+    def __init__(self, database_path, read_only=True, max_connections=8):
+
+        self.database_path = Path(database_path)
+        self.read_only = read_only
+        self.max_connections = max_connections
+        self.closed = False
+        self._idle = []
+        self._nb_open = 0
+        self._condition = threading.Condition()
+
+    def _open(self):
+
+        if self.read_only:
+            uri = f"{self.database_path.resolve().as_uri()}?mode=ro"
+            connection = sqlite3.connect(
+                uri, uri=True, check_same_thread=False, factory=PooledConnection
+            )
+            connection.execute("PRAGMA query_only = ON")
+        else:
+            connection = sqlite3.connect(
+                self.database_path, check_same_thread=False, factory=PooledConnection
+            )
+            connection.execute("PRAGMA journal_mode = WAL")
+
+        connection.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+        connection.execute(f"PRAGMA cache_size = {SQLITE_CACHE_SIZE}")
+        connection.pool = self
+        return connection
+
+    def _discard(self, connection):
+
+        connection.pool = None
+        try:
+            connection.close()
+        except sqlite3.Error:
+            pass
+        self._nb_open -= 1
+        self._condition.notify()
+
+    @staticmethod
+    def is_healthy(connection):
+
+        try:
+            connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self, timeout=None):
+
+        """
+        Return an idle healthy connection, opening a new one if none is left
+        and waiting for a release if max_connections are already in use
+        """
+
+        with self._condition:
+            while True:
+                if self.closed:
+                    raise sqlite3.ProgrammingError(
+                        f"Connection pool to {self.database_path} is closed"
+                    )
+                if self._idle:
+                    connection = self._idle.pop()
+                    if self.is_healthy(connection):
+                        return connection
+                    self._discard(connection)
+                elif self._nb_open < self.max_connections:
+                    self._nb_open += 1
+                    break
+                elif not self._condition.wait(timeout):
+                    raise TimeoutError(
+                        f"No connection to {self.database_path} available after {timeout}s"
+                    )
+
+        try:
+            return self._open()
+        except sqlite3.Error:
+            with self._condition:
+                self._nb_open -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, connection):
+
+        with self._condition:
+            if connection.in_transaction:
+                connection.rollback()
+            if self.closed or not self.is_healthy(connection):
+                self._discard(connection)
+            else:
+                self._idle.append(connection)
+                self._condition.notify()
+
+    @contextmanager
+    def cursor(self):
+
+        connection = self.acquire()
+        try:
+            yield connection.cursor()
+        finally:
+            self.release(connection)
+
+    def health_check(self):
+
+        """
+        Check that the database can still be read and return the pool usage
+        """
+
+        try:
+            with self.cursor() as cursor:
+                cursor.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            healthy = True
+        except (sqlite3.Error, TimeoutError):
+            healthy = False
+
+        with self._condition:
+            return {
+                "database": str(self.database_path),
+                "readOnly": self.read_only,
+                "healthy": healthy,
+                "open": self._nb_open,
+                "idle": len(self._idle),
+            }
+
+    def close(self):
+
+        """
+        Close the idle connections, the ones in use are closed when released
+        """
+
+        with self._condition:
+            self.closed = True
+            while self._idle:
+                self._discard(self._idle.pop())
+
+
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(database_path=DATABASE_PATH, read_only=True):
+
+    """
+    Return the process-wide pool for this database, creating it on first use
+    """
+
+    key = (Path(database_path).resolve(), read_only)
+    with _connection_pools_lock:
+        pool = _connection_pools.get(key)
+        if pool is None or pool.closed:
+            pool = ConnectionPool(
+                database_path, read_only, max_connections=8 if read_only else 1
+            )
+            _connection_pools[key] = pool
+        return pool
+
+
+@atexit.register
+def close_connection_pools():
+
+    with _connection_pools_lock:
+        for pool in _connection_pools.values():
+            pool.close()
+        _connection_pools.clear()
+
+
+def database_cursor(database_path=DATABASE_PATH, read_only=True):
+
+    """
+    Context manager lending a cursor from the pool of the database
+    """
+
+    return get_connection_pool(database_path, read_only).cursor()
+
+
+def connect_to_database(database_path=DATABASE_PATH, read_only=False):
 
     """
     Connect to the database and return the connection's cursor
+    The connection comes from the pool and goes back to it with connection.close()
     """
 
     try:
-        sqliteConnection = sqlite3.connect(database_path)
+        sqliteConnection = get_connection_pool(database_path, read_only).acquire()
         cursor = sqliteConnection.cursor()
         return sqliteConnection, cursor
     except sqlite3.Error as error:
@@ -18,12 +280,289 @@ def connect_to_database(database_path):
         exit(0)
 
 
+class ReferenceCache:
+
+    """
+    Process-wide cache of the reference tables of one database (anime_songs...), shared by every Streamlit session.
+    A table is reloaded when the database changed since it was cached: new mtime or size of the database
+    or of its WAL file, or new schema_version / user_version.
+    """
+
+    def __init__(self, database_path):
+
+        self.database_path = Path(database_path)
+        self._tables = {}
+        self._stats = {}
+        # Reentrant since a table can be built from another one
+        self._lock = threading.RLock()
+
+    def database_version(self):
+
+        files = [
+            self.database_path,
+            self.database_path.with_name(self.database_path.name + "-wal"),
+        ]
+        stats = [
+            (file.stat().st_mtime_ns, file.stat().st_size)
+            for file in files
+            if file.exists()
+        ]
+        with database_cursor(self.database_path) as cursor:
+            schema = cursor.execute(
+                "SELECT * FROM pragma_schema_version, pragma_user_version"
+            ).fetchone()
+        return tuple(stats), schema
+
+    def get(self, name, load):
+
+        """
+        Cached table name, load() building it again when the database changed
+        """
+
+        version = self.database_version()
+        with self._lock:
+            stats = self._stats.setdefault(
+                name, {"hits": 0, "misses": 0, "invalidations": 0, "loadTime": 0.0}
+            )
+            cached = self._tables.get(name)
+            if cached is not None and cached[0] == version:
+                stats["hits"] += 1
+                return cached[1]
+
+            stats["misses"] += 1
+            if cached is not None:
+                stats["invalidations"] += 1
+
+            start = time.perf_counter()
+            table = load()
+            stats["loadTime"] += time.perf_counter() - start
+            self._tables[name] = (version, table)
+            return table
+
+    def stats(self):
+
+        """
+        Hits, misses, invalidations and total load time of each table
+        """
+
+        with self._lock:
+            return {
+                name: {**stats, "cached": name in self._tables}
+                for name, stats in self._stats.items()
+            }
+
+    def clear(self):
+
+        with self._lock:
+            self._tables.clear()
+
+
+_reference_caches = {}
+
+
+def get_reference_cache(database_path=DATABASE_PATH):
+
+    """
+    Return the process-wide reference cache of this database, creating it on first use
+    """
+
+    key = Path(database_path).resolve()
+    with _connection_pools_lock:
+        return _reference_caches.setdefault(key, ReferenceCache(database_path))
+
+
+# Memory budget of the result cache, and where its evicted results are spilled (None to drop them)
+RESULT_CACHE_MAX_BYTES = 256 * 1024**2
+RESULT_CACHE_SPILL_PATH = None
+
+# Disk budget of the spilled results, the ones spilled first being removed first
+RESULT_CACHE_SPILL_MAX_BYTES = 1024**3
+
+# Name prefix of the spill files, the only files of the spill path the cache removes
+RESULT_CACHE_SPILL_PREFIX = "resultCache_"
+
+
+def result_size(value):
+
+    """
+    Approximate memory used by a cached result, DataFrames being measured deeply
+    """
+
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(np.sum(value.memory_usage(deep=True)))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            result_size(key) + result_size(item) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(result_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+
+    """
+    Process-wide LRU cache of derived results bounded by their size in bytes, shared by every Streamlit session.
+    With a spill_path, evicted results are pickled there and loaded back on the next get instead of being recomputed,
+    the spill files being bounded by spill_max_bytes.
+    """
+
+    def __init__(
+        self,
+        max_bytes=RESULT_CACHE_MAX_BYTES,
+        spill_path=None,
+        spill_max_bytes=RESULT_CACHE_SPILL_MAX_BYTES,
+    ):
+
+        self.max_bytes = max_bytes
+        self.spill_path = None if spill_path is None else Path(spill_path)
+        self.spill_max_bytes = spill_max_bytes
+        self.nb_bytes = 0
+        self.spill_bytes = 0
+        self._results = OrderedDict()
+        # Size of the spill file of each spilled key, first spilled first
+        self._spilled = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "evictedBytes": 0,
+            "spills": 0,
+            "spillHits": 0,
+            "spillEvictions": 0,
+        }
+
+        # Files spilled by a previous process are not tracked, so they would never be removed
+        if self.spill_path is not None and self.spill_path.exists():
+            for spill_file in self.spill_path.glob(f"{RESULT_CACHE_SPILL_PREFIX}*.pkl"):
+                spill_file.unlink(missing_ok=True)
+
+    def _spill_file(self, key):
+
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return self.spill_path / f"{RESULT_CACHE_SPILL_PREFIX}{digest}.pkl"
+
+    def _spill(self, key, value):
+
+        self.spill_path.mkdir(parents=True, exist_ok=True)
+        with open(self._spill_file(key), "wb") as spill_file:
+            pickle.dump(value, spill_file)
+        self._spilled[key] = self._spill_file(key).stat().st_size
+        self.spill_bytes += self._spilled[key]
+        self._stats["spills"] += 1
+
+        while self.spill_bytes > self.spill_max_bytes:
+            self._remove_spill(next(iter(self._spilled)))
+            self._stats["spillEvictions"] += 1
+
+    def _remove_spill(self, key):
+
+        if key in self._spilled:
+            self.spill_bytes -= self._spilled.pop(key)
+            self._spill_file(key).unlink(missing_ok=True)
+
+    def get(self, key):
+
+        """
+        Cached result of key, None if it is neither in memory nor spilled
+        """
+
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self._stats["hits"] += 1
+                return self._results[key][0]
+
+            if key in self._spilled:
+                with open(self._spill_file(key), "rb") as spill_file:
+                    value = pickle.load(spill_file)
+                # Back in memory, it is spilled again if evicted again
+                self._remove_spill(key)
+                self._stats["spillHits"] += 1
+                self._insert(key, value)
+                return value
+
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key, value):
+
+        with self._lock:
+            if key in self._results:
+                self.nb_bytes -= self._results.pop(key)[1]
+            self._remove_spill(key)
+            self._insert(key, value)
+
+    def _insert(self, key, value):
+
+        size = result_size(value)
+        self._results[key] = (value, size)
+        self.nb_bytes += size
+
+        # A result bigger than the budget is evicted right away
+        while self.nb_bytes > self.max_bytes:
+            evicted_key, (evicted, evicted_size) = self._results.popitem(last=False)
+            self.nb_bytes -= evicted_size
+            self._stats["evictions"] += 1
+            self._stats["evictedBytes"] += evicted_size
+            if self.spill_path is not None:
+                self._spill(evicted_key, evicted)
+
+    def stats(self):
+
+        """
+        Size accounting and hit, miss, eviction and spill counts
+        """
+
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._results),
+                "bytes": self.nb_bytes,
+                "maxBytes": self.max_bytes,
+                "spilledEntries": len(self._spilled),
+                "spilledBytes": self.spill_bytes,
+            }
+
+    def clear(self):
+
+        with self._lock:
+            self._results.clear()
+            self.nb_bytes = 0
+            for key in list(self._spilled):
+                self._remove_spill(key)
+
+
+_result_cache = None
+
+
+def get_result_cache():
+
+    """
+    Return the process-wide result cache, creating it on first use
+    """
+
+    global _result_cache
+    with _connection_pools_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache(RESULT_CACHE_MAX_BYTES, RESULT_CACHE_SPILL_PATH)
+        return _result_cache
+
+
 def run_sql_command(cursor, sql_command, data=None):
 
     """
     Run the SQL command with nice looking print when failed (no)
+    Without a cursor, one is borrowed from the read-only pool
     """
 
+    if cursor is None:
+        with database_cursor() as cursor:
+            return run_sql_command(cursor, sql_command, data)
+
     try:
         if data is not None:
             cursor.execute(sql_command, data)
@@ -55,56 +594,252 @@ def run_sql_command(cursor, sql_command, data=None):
         return None
 
 
+def stream_dtype(column):
+
+    """
+    dtype of column while streaming: codes for the encoded strings, raw ids for the region
+    """
+
+    if column in ENCODED_COLUMNS:
+        return np.int32
+    if column == "region":
+        return np.int8
+    return ANSWERS_SCHEMA[column]
+
+
+def stream_values(values, dtype):
+
+    """
+    Object array values as an array of dtype, with the mask of their NULLs (None when there is no NULL).
+    NULLs are NaN in the float columns and 0 in the other ones
+    """
+
+    dtype = np.dtype(dtype)
+    # Casting None to an integer raises, so booleans are read as int8 to raise too
+    stream = np.dtype(np.int8) if dtype == bool else dtype
+    try:
+        return values.astype(stream).astype(dtype, copy=False), None
+    except TypeError:
+        mask = pd.isna(values)
+        values = np.where(mask, 0, values).astype(stream)
+        return values.astype(dtype, copy=False), mask
+
+
+def mask_nulls(values, mask):
+
+    """
+    values as a nullable pandas array (Int32, boolean...) when mask has NULLs
+    """
+
+    if mask is None or not mask.any():
+        return values
+    if values.dtype == bool:
+        return pd.arrays.BooleanArray(values, mask)
+    return pd.arrays.IntegerArray(values, mask)
+
+
+def encode_strings(values, lookup):
+
+    """
+    Dictionary encode values, adding the strings never seen before to lookup.
+    NULL values get the -1 code
+    """
+
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    # Only the distinct strings of the chunk go through Python, -1 (NULL) is kept by the last item
+    remap = np.fromiter(
+        (lookup.setdefault(value, len(lookup)) for value in uniques),
+        dtype=np.int32,
+        count=len(uniques),
+    )
+    return np.append(remap, np.int32(-1))[codes]
+
+
+def decode_strings(codes, lookup, column):
+
+    """
+    Turn the codes of encode_strings into the dtype of column in ANSWERS_SCHEMA
+    """
+
+    categories = np.array(list(lookup), dtype=object)
+    if column == "date":
+        dates = pd.to_datetime(categories, format="%Y-%m-%d").values
+        return np.append(dates, np.datetime64("NaT"))[codes]
+
+    # Sort the categories, -1 (NULL) being mapped to itself by the last item
+    order = np.argsort(categories)
+    remap = np.full(len(categories) + 1, -1, dtype=np.int32)
+    remap[order] = np.arange(len(categories), dtype=np.int32)
+    return pd.Categorical.from_codes(remap[codes], categories=categories[order])
+
+
+def decode_regions(regions):
+
+    return pd.Categorical.from_codes(
+        REGION_CODES[np.asarray(regions, dtype=np.int8)], dtype=REGION_DTYPE
+    )
+
+
+def apply_answers_schema(df):
+
+    """
+    Cast an answers DataFrame built from SQLite rows to ANSWERS_SCHEMA,
+    the columns that are not in it (aggregates...) being left as they are.
+    Columns holding NULLs get their nullable dtype, as with extract_answers
+    """
+
+    for column in df.columns:
+        if column == "region":
+            df[column] = decode_regions(df[column].fillna(0))
+        elif column == "date":
+            df[column] = pd.to_datetime(df[column], format="%Y-%m-%d")
+        elif column in ANSWERS_SCHEMA:
+            dtype = ANSWERS_SCHEMA[column]
+            if df[column].isna().any():
+                dtype = NULLABLE_DTYPES.get(dtype, dtype)
+            df[column] = df[column].astype(dtype)
+    return df
+
+
+def iter_answers_chunks(cursor, columns, condition="", data=(), lookups=None):
+
+    """
+    Stream the answers as typed columnar chunks of at most ANSWERS_CHUNKSIZE rows,
+    so only one chunk of Python tuples is alive at a time.
+    Each chunk is a dict of NumPy arrays, strings being encoded as int32 codes of lookups,
+    yielded with the NULL mask of the integer and bool columns holding NULLs
+    """
+
+    lookups = {} if lookups is None else lookups
+    command = f"SELECT {', '.join(columns)} from players_answers {condition}"
+    cursor.execute(command, data)
+
+    while True:
+        rows = cursor.fetchmany(ANSWERS_CHUNKSIZE)
+        if not rows:
+            return
+        chunk, nulls = {}, {}
+        # Transposed at once by NumPy rather than tuple by tuple
+        for column, values in zip(columns, np.array(rows, dtype=object).T):
+            if column in ENCODED_COLUMNS:
+                chunk[column] = encode_strings(values, lookups.setdefault(column, {}))
+                continue
+            # A NULL region is decoded to NaN from its 0 code
+            chunk[column], mask = stream_values(values, stream_dtype(column))
+            if mask is not None and column != "region":
+                nulls[column] = mask
+        del rows
+        yield chunk, nulls
+
+
+@instrumentation.instrumented
+def extract_answers(columns, condition="", data=()):
+
+    """
+    Extract the answers matching condition chunk by chunk, concatenate the typed chunks
+    column by column, then decode them to ANSWERS_SCHEMA
+    """
+
+    condition = f"WHERE rankedId IS NOT NULL {'AND ' + condition if condition else ''}"
+
+    chunks = {column: [] for column in columns}
+    lookups, chunk_nulls, sizes = {}, [], []
+    with database_cursor() as cursor:
+        for chunk, nulls in iter_answers_chunks(
+            cursor, columns, condition, data, lookups
+        ):
+            sizes.append(len(chunk[columns[0]]))
+            for column in columns:
+                chunks[column].append(chunk.pop(column))
+            chunk_nulls.append(nulls)
+
+    arrays, masks = {}, {}
+    for column in columns:
+        # The chunks of a column are freed once concatenated, so only one column is held twice
+        arrays[column] = np.concatenate(
+            chunks.pop(column) or [np.empty(0, dtype=stream_dtype(column))]
+        )
+    for column in {column for nulls in chunk_nulls for column in nulls}:
+        masks[column] = np.concatenate(
+            [
+                nulls.get(column, np.zeros(size, dtype=bool))
+                for nulls, size in zip(chunk_nulls, sizes)
+            ]
+        )
+
+    # Decoded even without any row, so the columns always get their ANSWERS_SCHEMA dtype
+    for column in columns:
+        if column in ENCODED_COLUMNS:
+            arrays[column] = decode_strings(
+                arrays[column], lookups.get(column, {}), column
+            )
+        elif column == "region":
+            arrays[column] = decode_regions(arrays[column])
+        else:
+            arrays[column] = mask_nulls(arrays[column], masks.get(column))
+
+    return pd.DataFrame(arrays, columns=columns, copy=False)
+
+
 # @st.cache()
+@instrumentation.instrumented
 def extract_top_user_data():
 
-    sqliteConnection, cursor = connect_to_database("data/raw/rankedData.db")
-
-    region_map = {1: "Asia", 2: "Europe", 3: "America"}
-    command = f"SELECT date, region, playerName, isCorrect, rankedSongId, correctCount from players_answers"
-    results = run_sql_command(cursor, command)
-    df = pd.DataFrame(
-        results,
-        columns=[
+    return extract_answers(
+        [
             "date",
             "region",
             "playerName",
             "isCorrect",
             "rankedSongId",
             "correctCount",
-        ],
+        ]
     )
-    del results
-    return df.replace({"region": region_map})
 
 
 # @st.cache()
+@instrumentation.instrumented
 def extract_top_songs_data():
 
-    sqliteConnection, cursor = connect_to_database("data/raw/rankedData.db")
+    return extract_answers(["rankedId", "songId", "isCorrect"])
 
-    region_map = {1: "Asia", 2: "Europe", 3: "America"}
-    command = f"SELECT rankedId, songId, isCorrect from players_answers"
-    results = run_sql_command(cursor, command)
-    df = pd.DataFrame(
-        results,
-        columns=[
-            "rankedId",
-            "songId",
-            "isCorrect",
-        ],
-    )
-    del results
-    return df.replace({"region": region_map})
 
+@instrumentation.instrumented
+def extract_new_answers(last_ranked_id):
+
+    """
+    Extract the answers of the ranked games with an id above last_ranked_id
+    """
+
+    columns = [
+        "rankedId",
+        "date",
+        "region",
+        "playerName",
+        "rankedSongId",
+        "songId",
+        "isCorrect",
+        "correctCount",
+    ]
+    return extract_answers(columns, "rankedId > ?", (last_ranked_id,))
 
-# @st.cache(suppress_st_warning=True)
+
+@instrumentation.instrumented
 def extract_anime_songs():
 
-    sqliteConnection, cursor = connect_to_database("data/raw/rankedData.db")
+    """
+    anime_songs catalogue, shared through the reference cache.
+    It is the same DataFrame for every caller, do not modify it
+    """
+
+    return get_reference_cache().get("anime_songs", load_anime_songs)
+
+
+def load_anime_songs():
 
     command = f"SELECT * from anime_songs"
-    results = run_sql_command(cursor, command)
+    with database_cursor() as cursor:
+        results = run_sql_command(cursor, command)
     df = pd.DataFrame(
         results,
         columns=[
@@ -123,34 +858,72 @@ def extract_anime_songs():
     return df
 
 
-@st.cache(persist=False, suppress_st_warning=True, ttl=24 * 3600, max_entries=25)
-def extract_answers_username(username):
+# Song metadata kept in the songId index
+SONG_INDEX_COLUMNS = ["songName", "songArtist", "animeName", "songType"]
 
-    sqliteConnection, cursor = connect_to_database("data/raw/rankedData.db")
 
-    command = f"SELECT * from players_answers WHERE playerName='{username}'"
-    results = run_sql_command(cursor, command)
+def get_song_index():
 
-    region_map = {1: "Asia", 2: "Europe", 3: "America"}
+    """
+    Song metadata of anime_songs indexed by songId, shared through the reference cache.
+    A song in several anime keeps the metadata of its first row
+    """
 
-    df = pd.DataFrame(
-        results,
-        columns=[
-            "rankedId",
-            "date",
-            "region",
-            "rankedSongId",
-            "rankedSongNumber",
-            "songId",
-            "startTime",
-            "correctCount",
-            "activePlayers",
-            "playerId",
-            "playerName",
-            "animeId",
-            "guessTime",
-            "isCorrect",
-        ],
+    return get_reference_cache().get("songIndex", build_song_index)
+
+
+def build_song_index():
+
+    return (
+        extract_anime_songs()
+        .drop_duplicates("songId")
+        .set_index("songId")[SONG_INDEX_COLUMNS]
     )
+
+
+def lookup_songs(songIds, columns=None):
+
+    """
+    Metadata of each songId, in the same order (NaN for unknown songs)
+    """
+
+    song_index = get_song_index()
+    if columns is not None:
+        song_index = song_index[list(columns)]
+    return song_index.reindex(songIds)
+
+
+@instrumentation.instrumented
+def extract_answers_username(username, start_date=None, end_date=None, columns=None):
+
+    """
+    Extract the answers of username between start_date and end_date (included),
+    only selecting the requested columns (all of them by default)
+    """
+
+    columns = ANSWERS_COLUMNS if columns is None else list(columns)
+    unknown_columns = set(columns) - set(ANSWERS_COLUMNS)
+    if unknown_columns:
+        raise ValueError(f"Unknown players_answers columns: {unknown_columns}")
+
+    conditions = ["playerName = ?"]
+    data = [username]
+    if start_date is not None:
+        conditions.append("date >= ?")
+        data.append(str(start_date))
+    if end_date is not None:
+        conditions.append("date <= ?")
+        data.append(str(end_date))
+
+    command = f"SELECT {', '.join(columns)} from players_answers WHERE {' AND '.join(conditions)}"
+    with database_cursor() as cursor:
+        results = run_sql_command(cursor, command, data)
+
+    df = pd.DataFrame(results, columns=columns)
     del results
-    return df.replace({"region": region_map})
+    df = apply_answers_schema(df)
+
+    # The plots group by region, only keep the regions the user played in
+    if "region" in df.columns:
+        df["region"] = df.region.cat.remove_unused_categories()
+    return df